@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .chartWorkers import chart_workers
+from .readingStats import get_year_stats
+
+CHART_CACHE_BYTES = int(os.getenv("CHART_CACHE_BYTES", str(32 * 1024 * 1024)))
+# bump when a plot's look changes, so browsers holding the old ETag get the new image
+CHART_VERSION = 1
+
+ChartKey = Tuple[str, int, str, str]  # (user_id, year, kind, data fingerprint)
+
+
+def data_fingerprint(stats: Dict[str, Any]) -> str:
+    # hash of the year record a chart is drawn from; equal data always draws the same PNG
+    return hashlib.sha256(json.dumps(stats, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def chart_etag(kind: str, year: int, fingerprint: str) -> str:
+    digest = hashlib.sha256(f"{CHART_VERSION}:{kind}:{year}:{fingerprint}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ChartCache:
+    # LRU of rendered PNGs bounded by their total size; a user's chart is replaced once its data changes.
+    # b"" records that the data has nothing to draw, so that answer is cached too
+    def __init__(self, max_bytes: int = CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[ChartKey, bytes]" = OrderedDict()
+        self._current: Dict[Tuple[str, int, str], ChartKey] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: ChartKey) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+
+    def put(self, key: ChartKey, png: bytes) -> None:
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._current.get(key[:3])
+            if previous is not None and previous != key:
+                self._drop(previous)
+            self._drop(key)
+            self._entries[key] = png
+            self._current[key[:3]] = key
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: ChartKey) -> None:
+        png = self._entries.pop(key, None)
+        if png is not None:
+            self.size -= len(png)
+            if self._current.get(key[:3]) == key:
+                del self._current[key[:3]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current.clear()
+            self.size = 0
+
+
+chart_cache = ChartCache()
+
+
+async def get_chart(
+    user_id: str,
+    year: int,
+    kind: str,
+    if_none_match: Optional[str] = None,
+) -> Optional[Tuple[str, Optional[bytes]]]:
+    # (etag, png) for one chart; png is None when the client's copy is still current.
+    # None when the year has nothing to draw. Only the asked-for chart is ever rendered, in the worker pool;
+    # raises ChartBusy or asyncio.TimeoutError from there
+    stats = (await get_year_stats(user_id, [year]))[0]
+    if not stats["book_count"]:
+        return None
+
+    fingerprint = data_fingerprint(stats)
+    etag = chart_etag(kind, year, fingerprint)
+    if etag_matches(if_none_match, etag):
+        return etag, None
+
+    key = (str(user_id), year, kind, fingerprint)
+    png = chart_cache.get(key)
+    if png is None:
+        png = await chart_workers.render(kind, stats) or b""
+        chart_cache.put(key, png)
+    return (etag, png) if png else None
@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+from .userMatplotlib import render_chart
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_QUEUE_LIMIT = int(os.getenv("CHART_QUEUE_LIMIT", "16"))  # renders running or waiting, across the process
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "10"))
+
+# renders run in their own processes so a figure never holds the event loop or the GIL of the api worker.
+# workers are spawned, not forked: forking a process that already runs threads (uvicorn, the recommend cache
+# refreshers) can copy held locks into the child
+
+
+class ChartBusy(Exception):
+    # the render queue is full; the caller should answer 503 and let the client retry
+    pass
+
+
+def _warm() -> None:
+    # worker initializer: load the Agg backend and build the font cache before the first real request
+    render_chart("pages", {"year": 2000, "book_count": 1, "pages_per_month": [1] * 12})
+
+
+class ChartWorkerPool:
+    def __init__(
+        self,
+        workers: int = CHART_WORKERS,
+        queue_limit: int = CHART_QUEUE_LIMIT,
+        timeout: float = CHART_RENDER_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        # spawns the workers and warms each one; called at startup so the first chart does not pay for it
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm,
+            )
+        for _ in range(self.workers):  # processes start on demand, so hand each one a no-op
+            executor.submit(int)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        # drops a broken pool so the next submit starts a new one; a pool another request already replaced it with is kept
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, kind: str, stats: Dict[str, Any]) -> Tuple[ProcessPoolExecutor, Future]:
+        self.start()
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                raise ChartBusy(f"{self.pending} charts already queued")
+            executor = self._executor
+            if executor is None:
+                raise BrokenProcessPool("chart workers were shut down")
+            try:
+                future = executor.submit(render_chart, kind, stats)
+            except BrokenProcessPool:
+                future = None  # a worker died while the pool was idle; discarded below, outside the lock
+            else:
+                self.pending += 1
+        if future is None:
+            self._discard(executor)
+            raise BrokenProcessPool("a chart worker died while the pool was idle")
+        # a render that timed out still occupies a worker, so it keeps counting until it really finishes
+        future.add_done_callback(self._done)
+        return executor, future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def render(self, kind: str, stats: Dict[str, Any]) -> Optional[bytes]:
+        # raises ChartBusy when the queue is full, asyncio.TimeoutError after timeout seconds and
+        # BrokenProcessPool when a freshly started pool breaks too
+        for attempt in range(2):
+            try:
+                executor, future = self._submit(kind, stats)
+            except BrokenProcessPool:
+                # the pool was found broken at submit and has been dropped; the retry starts a new one
+                print("[chart_workers] worker pool broken, restarting")
+                if attempt:
+                    raise
+                continue
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except BrokenProcessPool:
+                # a worker died (killed, out of memory) during the render
+                print("[chart_workers] worker pool broken, restarting")
+                self._discard(executor)
+                if attempt:
+                    raise
+        return None  # not reached: the second attempt returns or raises
+
+
+chart_workers = ChartWorkerPool()
@@ -0,0 +1,36 @@
+import hashlib
+import json
+from typing import Optional
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import Response
+from .chartService import etag_matches
+from .referenceData import genres
+
+router = APIRouter(prefix="/api/genres", tags=["genres"])
+
+# the genre list changes a few times a year; browsers and CDNs may reuse it for an hour
+GENRES_CACHE_CONTROL = "public, max-age=3600"
+
+
+@router.get("")
+def list_genres(
+    name: Optional[str] = Query(None, description="exact name, case-insensitive"),
+    prefix: Optional[str] = Query(None, description="name prefix, case-insensitive"),
+    limit: int = Query(50, ge=1, le=1000, description="most rows returned for a prefix or the full list"),
+    if_none_match: Optional[str] = Header(None),
+):
+    # served from the in-memory reference table, so it never costs a database round trip
+    index = genres()
+    if name is not None:
+        ids = index.lookup(name)
+    elif prefix is not None:
+        ids = index.prefix(prefix, limit)
+    else:
+        ids = [row["genre_id"] for row in index.rows("genre_id", "name")][:limit]
+
+    body = json.dumps([{"genre_id": i, "name": index.name(i)} for i in ids], separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": GENRES_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -2,24 +2,19 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from .security import get_current_user
-import os
-import json
-import urllib.request
-import urllib.parse
-import urllib.error
+from .shelfOverview import ShelfOverviewUnavailable, fetch_shelf_overview
+from .workCards import get_work_cards
+from .supabaseRest import (
+    SupabaseError,
+    count,
+    gather_queries,
+    insert,
+    select,
+    to_http_exception,
+)
 
 router = APIRouter(prefix="/api/home", tags=["home"],)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-def supabase_headers() -> dict:
-    return {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
 
 def normalize_cover_url(raw: Optional[str]) -> Optional[str]:
     if not raw:
@@ -30,6 +25,26 @@ def normalize_cover_url(raw: Optional[str]) -> Optional[str]:
         return raw
     return None
 
+
+async def work_items(work_ids: List[str]) -> List[Dict[str, Any]]:
+    # list rows for the given works in the given order, hydrated from the shared work-card cache
+    cards = await get_work_cards(work_ids)
+    items: List[Dict[str, Any]] = []
+    for wid in work_ids:
+        card = cards.get(wid)
+        if card is None:
+            continue
+        items.append(
+            {
+                "work_id": wid,
+                "edition_id": card.get("edition_id"),
+                "title": card.get("title") or f"Work {wid}",
+                "cover_url": card.get("cover_url"),
+            }
+        )
+    return items
+
+
 class ShelfCreate(BaseModel):
     name: str
     visibility: str = "private"
@@ -44,33 +59,17 @@ async def get_favorites(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
-
     shelf_params = {
         "select": "shelf_id",
         "user_id": f"eq.{user['id']}",
         "name": "eq.favorites",
         "limit": "1",
     }
-    shelf_url = f"{SUPABASE_URL}/rest/v1/shelves?{urllib.parse.urlencode(shelf_params)}"
 
     try:
-        s_req = urllib.request.Request(shelf_url, headers=headers, method="GET")
-        with urllib.request.urlopen(s_req, timeout=10) as s_resp:
-            s_body = s_resp.read().decode("utf-8")
-        shelf_rows = json.loads(s_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.favorites] shelves HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading shelves ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.favorites] shelves error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load favorites shelf")
+        shelf_rows = await select("shelves", shelf_params)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.favorites")
 
     if not shelf_rows:
         return []
@@ -85,25 +84,11 @@ async def get_favorites(
         "order": "added_at.desc",
         "limit": str(limit),
     }
-    si_url = f"{SUPABASE_URL}/rest/v1/shelf_items?{urllib.parse.urlencode(si_params)}"
 
     try:
-        si_req = urllib.request.Request(si_url, headers=headers, method="GET")
-        with urllib.request.urlopen(si_req, timeout=10) as si_resp:
-            si_body = si_resp.read().decode("utf-8")
-        si_rows = json.loads(si_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.favorites] shelf_items HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading shelf_items ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.favorites] shelf_items error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load favorites")
+        si_rows = await select("shelf_items", si_params)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.favorites")
 
     if not si_rows:
         return []
@@ -115,7 +100,7 @@ async def get_favorites(
         wid = row.get("work_id")
         if not wid:
             continue
-        
+
         wid_str = str(wid)
         if wid_str not in shelf_order:
             shelf_order[wid_str] = idx
@@ -124,32 +109,12 @@ async def get_favorites(
     if not work_ids:
         return []
 
-    ed_params = {
-        "select": "edition_id,work_id,cover_url,works!inner(title)",
-        "work_id": f"in.({','.join(work_ids)})",
-        "order": "pub_date.desc",
-    }
-    ed_url = f"{SUPABASE_URL}/rest/v1/editions?{urllib.parse.urlencode(ed_params)}"
-
     try:
-        ed_req = urllib.request.Request(ed_url, headers=headers, method="GET")
-        with urllib.request.urlopen(ed_req, timeout=10) as ed_resp:
-            ed_body = ed_resp.read().decode("utf-8")
-        ed_rows = json.loads(ed_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.favorites] editions HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading editions ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.favorites] editions error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load favorite books")
+        favorites = await work_items(work_ids)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.favorites")
 
-    if not ed_rows:
+    if not favorites:
         return [
             {
                 "work_id": wid,
@@ -160,29 +125,6 @@ async def get_favorites(
             for wid in work_ids
         ][:limit]
 
-    favorites: List[Dict[str, Any]] = []
-    seen: set[str] = set()
-
-    for row in ed_rows:
-        wid = row.get("work_id")
-        if not wid:
-            continue
-        
-        wid_str = str(wid)
-        if wid_str in seen:
-            continue
-        seen.add(wid_str)
-
-        title = (row.get("works") or {}).get("title") or f"Work {wid_str}"
-        favorites.append(
-            {
-                "work_id": wid_str,
-                "edition_id": row.get("edition_id"),
-                "title": title,
-                "cover_url": row.get("cover_url"),
-            }
-        )
-    favorites.sort(key=lambda r: shelf_order.get(str(r["work_id"]), 0))
     return favorites[:limit]
 
 
@@ -195,33 +137,17 @@ async def get_shelf_items(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
-    
     shelf_params = {
         "select": "shelf_id,name",
         "shelf_id": f"eq.{shelf_id}",
         "user_id": f"eq.{user['id']}",
         "limit": "1",
     }
-    shelf_url = f"{SUPABASE_URL}/rest/v1/shelves?{urllib.parse.urlencode(shelf_params)}"
 
     try:
-        s_req = urllib.request.Request(shelf_url, headers=headers, method="GET")
-        with urllib.request.urlopen(s_req, timeout=10) as s_resp:
-            s_body = s_resp.read().decode("utf-8")
-        shelf_rows = json.loads(s_body)
-
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.shelf_items] shelves HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading shelves ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.shelf_items] shelves error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load shelf")
+        shelf_rows = await select("shelves", shelf_params)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.shelf_items")
 
     if not shelf_rows:
         raise HTTPException(status_code=404, detail="Shelf not found")
@@ -233,25 +159,11 @@ async def get_shelf_items(
         "order": "added_at.desc",
         "limit": str(limit),
     }
-    si_url = f"{SUPABASE_URL}/rest/v1/shelf_items?{urllib.parse.urlencode(si_params)}"
 
     try:
-        si_req = urllib.request.Request(si_url, headers=headers, method="GET")
-        with urllib.request.urlopen(si_req, timeout=10) as si_resp:
-            si_body = si_resp.read().decode("utf-8")
-        si_rows = json.loads(si_body)
-
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.shelf_items] shelf_items HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading shelf_items ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.shelf_items] shelf_items error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load list items")
+        si_rows = await select("shelf_items", si_params)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.shelf_items")
 
     if not si_rows:
         return {
@@ -280,64 +192,21 @@ async def get_shelf_items(
             "items": [],
         }
 
-    ed_params = {
-        "select": "edition_id,work_id,cover_url,works!inner(title)",
-        "work_id": f"in.({','.join(work_ids)})",
-        "order": "pub_date.desc",
-    }
-    ed_url = f"{SUPABASE_URL}/rest/v1/editions?{urllib.parse.urlencode(ed_params)}"
-
     try:
-        ed_req = urllib.request.Request(ed_url, headers=headers, method="GET")
-        with urllib.request.urlopen(ed_req, timeout=10) as ed_resp:
-            ed_body = ed_resp.read().decode("utf-8")
-        ed_rows = json.loads(ed_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.shelf_items] editions HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading editions ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.shelf_items] editions error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load books for this list")
-
-    items: list[dict[str, Any]] = []
-    seen: set[str] = set()
-
-    if not ed_rows:
-        for wid in work_ids:
-            items.append(
-                {
-                    "work_id": wid,
-                    "edition_id": None,
-                    "title": f"Work {wid}",
-                    "cover_url": None,
-                }
-            )
-    else:
-        for row in ed_rows:
-            wid = row.get("work_id")
-            if not wid:
-                continue
-            wid_str = str(wid)
-            if wid_str in seen:
-                continue
-            seen.add(wid_str)
-
-            title = (row.get("works") or {}).get("title") or f"Work {wid_str}"
-            items.append(
-                {
-                    "work_id": wid_str,
-                    "edition_id": row.get("edition_id"),
-                    "title": title,
-                    "cover_url": row.get("cover_url"),
-                }
-            )
-    items.sort(key=lambda r: shelf_order.get(str(r["work_id"]), 0))
+        items = await work_items(work_ids)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.shelf_items")
+
+    if not items:
+        items = [
+            {
+                "work_id": wid,
+                "edition_id": None,
+                "title": f"Work {wid}",
+                "cover_url": None,
+            }
+            for wid in work_ids
+        ]
 
     return {
         "shelf_id": shelf_id,
@@ -354,83 +223,55 @@ async def get_shelves(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
+    # one round trip through the shelf_overview function; the per-shelf queries are kept for databases without it
+    try:
+        rows = await fetch_shelf_overview(user["id"], limit)
+    except ShelfOverviewUnavailable:
+        return await shelves_multi_step(user["id"], limit)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.shelves")
+
+    for row in rows:
+        row["cover_url"] = normalize_cover_url(row.get("cover_url"))
+    return rows
+
+
+async def shelves_multi_step(user_id: str, limit: int) -> List[Dict[str, Any]]:
+    # one request: the shelves with each one's item count and newest item (the cover sample) embedded,
+    # so neither every item nor one query per shelf is needed
     shelf_params = {
-        "select": "shelf_id,name,is_default,visibility",
-        "user_id": f"eq.{user['id']}",
+        "select": "shelf_id,name,is_default,visibility,item_count:shelf_items(count),latest:shelf_items(work_id)",
+        "user_id": f"eq.{user_id}",
         "order": "is_default.desc,name.asc",
         "limit": str(limit),
+        "latest.order": "added_at.desc",
+        "latest.limit": "1",
     }
-    shelf_url = f"{SUPABASE_URL}/rest/v1/shelves?{urllib.parse.urlencode(shelf_params)}"
 
     try:
-        s_req = urllib.request.Request(shelf_url, headers=headers, method="GET")
-        with urllib.request.urlopen(s_req, timeout=10) as s_resp:
-            s_body = s_resp.read().decode("utf-8")
-        shelf_rows = json.loads(s_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[home.shelves] shelves HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading shelves ({e.code}): {body}",
-        )
-    
-    except Exception as e:
-        print("[home.shelves] shelves error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load shelves")
+        shelf_rows = await select("shelves", shelf_params)
+    except SupabaseError as e:
+        raise to_http_exception(e, "home.shelves")
 
     if not shelf_rows:
         return []
 
-    shelf_ids: List[str] = []
+    counts_by_id: Dict[str, int] = {}
+    sample_work_by_shelf: Dict[str, str] = {}
+
     for row in shelf_rows:
         sid = row.get("shelf_id")
         if sid is None:
             continue
-        shelf_ids.append(str(sid))
-
-    counts_by_id: Dict[str, int] = {}
-    sample_work_by_shelf: Dict[str, str] = {}
-
-    if shelf_ids:
-        si_params = {
-            "select": "shelf_id,work_id,added_at",
-            "shelf_id": f"in.({','.join(shelf_ids)})",
-            "order": "added_at.desc",
-            "limit": "10000",
-        }
-        si_url = f"{SUPABASE_URL}/rest/v1/shelf_items?{urllib.parse.urlencode(si_params)}"
-
-        try:
-            si_req = urllib.request.Request(si_url, headers=headers, method="GET")
-            with urllib.request.urlopen(si_req, timeout=10) as si_resp:
-                si_body = si_resp.read().decode("utf-8")
-            si_rows = json.loads(si_body)
-        
-        except urllib.error.HTTPError as e:
-            body = e.read().decode("utf-8", errors="ignore")
-            print("[home.shelves] shelf_items HTTPError", e.code, body)
-            si_rows = []
-        
-        except Exception as e:
-            print("[home.shelves] shelf_items error:", repr(e))
-            si_rows = []
-
-        for row in si_rows:
-            sid = row.get("shelf_id")
-            wid = row.get("work_id")
-            
-            if sid is None or wid is None:
-                continue
+        sid_str = str(sid)
 
-            sid_str = str(sid)
-            wid_str = str(wid)
-            counts_by_id[sid_str] = counts_by_id.get(sid_str, 0) + 1
+        item_count = row.get("item_count") or []
+        counts_by_id[sid_str] = item_count[0].get("count", 0) if item_count else 0
+        latest = row.get("latest") or []
+        wid = latest[0].get("work_id") if latest else None
 
-            if sid_str not in sample_work_by_shelf:
-                sample_work_by_shelf[sid_str] = wid_str
+        if wid is not None:
+            sample_work_by_shelf[sid_str] = str(wid)
 
     cover_by_work: Dict[str, Optional[str]] = {}
     sample_work_ids = list({wid for wid in sample_work_by_shelf.values() if wid})
@@ -441,21 +282,11 @@ async def get_shelves(
             "work_id": f"in.({','.join(sample_work_ids)})",
             "order": "pub_date.desc",
         }
-        ed_url = f"{SUPABASE_URL}/rest/v1/editions?{urllib.parse.urlencode(ed_params)}"
 
         try:
-            ed_req = urllib.request.Request(ed_url, headers=headers, method="GET")
-            with urllib.request.urlopen(ed_req, timeout=10) as ed_resp:
-                ed_body = ed_resp.read().decode("utf-8")
-            ed_rows = json.loads(ed_body)
-        
-        except urllib.error.HTTPError as e:
-            body = e.read().decode("utf-8", errors="ignore")
-            print("[home.shelves] editions HTTPError", e.code, body)
-            ed_rows = []
-        
-        except Exception as e:
-            print("[home.shelves] editions error:", repr(e))
+            ed_rows = await select("editions", ed_params)
+        except SupabaseError as e:
+            print("[home.shelves] editions error", e.status_code, e.body)
             ed_rows = []
 
         for row in ed_rows:
@@ -476,10 +307,10 @@ async def get_shelves(
     result: List[Dict[str, Any]] = []
     for row in shelf_rows:
         sid = row.get("shelf_id")
-        
+
         if sid is None:
             continue
-        
+
         sid_str = str(sid)
         sample_wid = sample_work_by_shelf.get(sid_str)
         cover_url = cover_by_work.get(sample_wid) if sample_wid else None
@@ -509,115 +340,60 @@ async def create_shelf(
     if not name:
         raise HTTPException(status_code=400, detail="name is required")
 
-    headers = supabase_headers()
-    headers["Prefer"] = "return=representation"
     supabase_row = {
         "user_id": user["id"],
         "name": name,
         "visibility": payload.visibility,
         "is_default": payload.is_default,
     }
-    url = f"{SUPABASE_URL}/rest/v1/shelves"
-    data = json.dumps(supabase_row).encode("utf-8")
 
     try:
-        req = urllib.request.Request(url, data=data, headers=headers, method="POST")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8")
-        rows = json.loads(body)
-        row = rows[0] if isinstance(rows, list) and rows else rows
-
-        return {
-            "shelf_id": row.get("shelf_id"),
-            "name": row.get("name"),
-            "visibility": row.get("visibility"),
-            "is_default": row.get("is_default", False),
-            "book_count": 0,
-        }
-
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8", errors="ignore")
-        print("[home.shelves] create HTTPError", e.code, error_body)
-        
-        if e.code == 409:
+        rows = await insert("shelves", supabase_row)
+    except SupabaseError as e:
+        if e.status_code == 409:
+            print("[home.shelves] create conflict", e.body)
             raise HTTPException(
                 status_code=400,
                 detail="You already have a list with that name.",
             )
-        
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while creating shelf ({e.code}): {error_body}",
-        )
-    
-    except Exception as e:
-        print("[home.shelves] create error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to create shelf")
+        raise to_http_exception(e, "home.shelves", action="creating")
 
+    row = rows[0] if isinstance(rows, list) and rows else rows
 
-def count_user_rows(table: str, user_id: str, headers: Dict[str, str]) -> int:
-    params = {
-        "select": "work_id",
-        "user_id": f"eq.{user_id}",
-        "limit": "10000",
+    return {
+        "shelf_id": row.get("shelf_id"),
+        "name": row.get("name"),
+        "visibility": row.get("visibility"),
+        "is_default": row.get("is_default", False),
+        "book_count": 0,
     }
-    url = f"{SUPABASE_URL}/rest/v1/{table}?{urllib.parse.urlencode(params)}"
-    
-    try:
-        req = urllib.request.Request(url, headers=headers, method="GET")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8")
-        rows = json.loads(body)
-        return len(rows)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print(f"[home.list_summary] HTTPError while counting {table}", e.code, body)
-        return 0
-    
-    except Exception as e:
-        print(f"[home.list_summary] error while counting {table}:", repr(e))
-        return 0
-
-
-def pick_cover_for_table(
+
+
+async def count_user_rows(table: str, user_id: str) -> int:
+    return await count(table, {"user_id": f"eq.{user_id}"})
+
+
+async def pick_cover_for_table(
     table: str,
     order_column: str,
     user_id: str,
-    headers: Dict[str, str],
 ) -> Optional[str]:
-    base_url = f"{SUPABASE_URL}/rest/v1/{table}"
     params = {
         "select": f"work_id,{order_column}",
         "user_id": f"eq.{user_id}",
         "order": f"{order_column}.desc",
         "limit": "20",
     }
-    url = f"{base_url}?{urllib.parse.urlencode(params)}"
-
-    try:
-        req = urllib.request.Request(url, headers=headers, method="GET")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8")
-        rows = json.loads(body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print(f"[home.list_summary] HTTPError while fetching {table}", e.code, body)
-        return None
-    
-    except Exception as e:
-        print(f"[home.list_summary] error while fetching {table}:", repr(e))
-        return None
+    rows = await select(table, params)
 
     work_ids: List[str] = []
     for row in rows:
         wid = row.get("work_id")
-        
+
         if not wid:
             continue
         wid_str = str(wid)
-        
+
         if wid_str not in work_ids:
             work_ids.append(wid_str)
 
@@ -629,22 +405,7 @@ def pick_cover_for_table(
         "work_id": f"in.({','.join(work_ids)})",
         "order": "pub_date.desc",
     }
-    ed_url = f"{SUPABASE_URL}/rest/v1/editions?{urllib.parse.urlencode(ed_params)}"
-
-    try:
-        ed_req = urllib.request.Request(ed_url, headers=headers, method="GET")
-        with urllib.request.urlopen(ed_req, timeout=10) as ed_resp:
-            ed_body = ed_resp.read().decode("utf-8")
-        ed_rows = json.loads(ed_body)
-    
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print(f"[home.list_summary] editions HTTPError for {table}", e.code, body)
-        return None
-    
-    except Exception as e:
-        print(f"[home.list_summary] editions error for {table}:", repr(e))
-        return None
+    ed_rows = await select("editions", ed_params)
 
     for row in ed_rows:
         cover = normalize_cover_url(row.get("cover_url"))
@@ -659,30 +420,35 @@ async def list_summary(user: dict = Depends(get_current_user)):
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
-    reading_count = count_user_rows("reading_progress", user["id"], headers)
-    completed_count = count_user_rows("completions", user["id"], headers)
-    reading_cover = pick_cover_for_table(
-        "reading_progress", "updated_at", user["id"], headers
-    )
-    completed_cover = pick_cover_for_table(
-        "completions", "finished_at", user["id"], headers
+    # each piece degrades on its own, so one slow or failing table does not blank the whole summary
+    summary = await gather_queries(
+        {
+            "reading_count": count_user_rows("reading_progress", user["id"]),
+            "completed_count": count_user_rows("completions", user["id"]),
+            "reading_cover_url": pick_cover_for_table(
+                "reading_progress", "updated_at", user["id"]
+            ),
+            "completed_cover_url": pick_cover_for_table(
+                "completions", "finished_at", user["id"]
+            ),
+        },
+        fallbacks={
+            "reading_count": 0,
+            "completed_count": 0,
+            "reading_cover_url": None,
+            "completed_cover_url": None,
+        },
+        log_prefix="home.list_summary",
     )
 
-    return {
-        "reading_count": reading_count,
-        "completed_count": completed_count,
-        "reading_cover_url": reading_cover,
-        "completed_cover_url": completed_cover,
-    }
+    return summary
 
 
-def user_books_from_table(
+async def user_books_from_table(
     table: str,
     order_column: str,
     user_id: str,
     limit: int,
-    headers: Dict[str, str],
 ) -> List[Dict[str, Any]]:
     params = {
         "select": f"work_id,{order_column}",
@@ -690,24 +456,11 @@ def user_books_from_table(
         "order": f"{order_column}.desc",
         "limit": str(limit),
     }
-    base_url = f"{SUPABASE_URL}/rest/v1/{table}"
-    url = f"{base_url}?{urllib.parse.urlencode(params)}"
 
     try:
-        req = urllib.request.Request(url, headers=headers, method="GET")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8")
-        rows = json.loads(body)
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print(f"[home.{table}_list] HTTPError reading {table}", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading {table} ({e.code}): {body}",
-        )
-    except Exception as e:
-        print(f"[home.{table}_list] error reading {table}:", repr(e))
-        raise HTTPException(status_code=500, detail=f"Failed to load {table}")
+        rows = await select(table, params)
+    except SupabaseError as e:
+        raise to_http_exception(e, f"home.{table}_list")
 
     if not rows:
         return []
@@ -727,52 +480,11 @@ def user_books_from_table(
     if not work_ids:
         return []
 
-    ed_params = {
-        "select": "edition_id,work_id,cover_url,works!inner(title)",
-        "work_id": f"in.({','.join(work_ids)})",
-        "order": "pub_date.desc",
-    }
-    ed_url = f"{SUPABASE_URL}/rest/v1/editions?{urllib.parse.urlencode(ed_params)}"
-
     try:
-        ed_req = urllib.request.Request(ed_url, headers=headers, method="GET")
-        with urllib.request.urlopen(ed_req, timeout=10) as ed_resp:
-            ed_body = ed_resp.read().decode("utf-8")
-        ed_rows = json.loads(ed_body)
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print(f"[home.{table}_list] editions HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Supabase error while reading editions ({e.code}): {body}",
-        )
-    except Exception as e:
-        print(f"[home.{table}_list] editions error:", repr(e))
-        raise HTTPException(status_code=500, detail="Failed to load editions")
-
-    items: List[Dict[str, Any]] = []
-    seen: set[str] = set()
-
-    for row in ed_rows:
-        wid = row.get("work_id")
-        if not wid:
-            continue
-        wid_str = str(wid)
-        if wid_str in seen:
-            continue
-        seen.add(wid_str)
-
-        title = (row.get("works") or {}).get("title") or f"Work {wid_str}"
-        items.append(
-            {
-                "work_id": wid_str,
-                "edition_id": row.get("edition_id"),
-                "title": title,
-                "cover_url": row.get("cover_url"),
-            }
-        )
+        items = await work_items(work_ids)
+    except SupabaseError as e:
+        raise to_http_exception(e, f"home.{table}_list")
 
-    items.sort(key=lambda r: order_map.get(str(r["work_id"]), 0))
     return items[:limit]
 
 
@@ -784,9 +496,8 @@ async def reading_list(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
-    items = user_books_from_table(
-        "reading_progress", "updated_at", user["id"], limit, headers
+    items = await user_books_from_table(
+        "reading_progress", "updated_at", user["id"], limit
     )
 
     return {
@@ -803,9 +514,8 @@ async def completed_list(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
-    items = user_books_from_table(
-        "completions", "finished_at", user["id"], limit, headers
+    items = await user_books_from_table(
+        "completions", "finished_at", user["id"], limit
     )
 
     return {
@@ -0,0 +1,554 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import httpx
+from . import supabaseRest
+from .shelfOverview import RPC_NAME, shelf_overview_local
+
+# in-process stand-in for the PostgREST subset the api uses, for hermetic tests and benchmarks:
+#   select with embeds (filters, order and limit/offset on an embed via "alias.param", alias(count) counts),
+#   eq/neq/gt/gte/lt/lte/in/like/ilike/is filters, order, limit/offset,
+#   insert and upsert (on_conflict + Prefer resolution), Prefer count/return, and rpc/shelf_overview.
+# rows live in memory (loaded from the app.syntheticData fixture), every request is counted and can be
+# delayed by an injected latency. Two ways in:
+#   install(LocalSupabase.from_fixture(path)) points supabaseRest's clients at an httpx transport (no sockets)
+#   python -m app.localSupabase --fixture fixture.json --port 54321 --latency 0.02 serves it over HTTP, then
+#   run uvicorn with SUPABASE_URL=http://127.0.0.1:54321
+
+# child table -> {column: parent table}; the key column has the same name on both sides
+FOREIGN_KEYS: Dict[str, Dict[str, str]] = {
+    "editions": {"work_id": "works"},
+    "work_authors": {"work_id": "works", "author_id": "authors"},
+    "work_genres": {"work_id": "works", "genre_id": "genres"},
+    "shelf_items": {"shelf_id": "shelves", "work_id": "works"},
+    "completions": {"work_id": "works"},
+    "reading_progress": {"work_id": "works"},
+}
+# conflict target used by duplicate checks and by upserts without on_conflict
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "works": ("work_id",),
+    "editions": ("edition_id",),
+    "authors": ("author_id",),
+    "genres": ("genre_id",),
+    "work_authors": ("work_id", "author_id"),
+    "work_genres": ("work_id", "genre_id"),
+    "shelves": ("shelf_id",),
+    "shelf_items": ("shelf_id", "work_id"),
+    "reading_progress": ("user_id", "work_id"),
+    "reading_challenges": ("user_id", "year"),
+}
+# columns the database fills in when an insert leaves them out
+DEFAULTS = {
+    "shelves": {"shelf_id": lambda: str(uuid.uuid4()), "created_at": lambda: _now()},
+    "shelf_items": {"added_at": lambda: _now()},
+}
+
+FILTER_OPS = {"eq", "neq", "gt", "gte", "lt", "lte", "in", "like", "ilike", "is"}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+SINGLE_OBJECT = "application/vnd.pgrst.object+json"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str, details: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.details = details
+
+    def body(self) -> Dict[str, Any]:
+        return {"code": self.code, "message": self.message, "details": self.details, "hint": None}
+
+
+def _split_top_level(text: str) -> List[str]:
+    # "a,b(c,d),e" -> ["a", "b(c,d)", "e"]
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return [p for p in parts if p]
+
+
+def parse_select(text: str) -> List[Dict[str, Any]]:
+    # each field is {"name", "alias"} or, for an embed, also {"inner", "fields"}
+    fields = []
+    for part in _split_top_level(text or "*"):
+        alias = None
+        if ":" in part.split("(", 1)[0]:
+            alias, part = part.split(":", 1)
+        if "(" in part:
+            head, inner = part.split("(", 1)
+            name, _, hint = head.partition("!")
+            fields.append({
+                "name": name.strip(),
+                "alias": (alias or name).strip(),
+                "inner": hint.strip() == "inner",
+                "fields": parse_select(inner[:-1]),
+            })
+        else:
+            name = part.split("::", 1)[0].strip()
+            fields.append({"name": name, "alias": (alias or name).strip()})
+    return fields
+
+
+def _index_key(value: Any) -> str:
+    # the text PostgREST would accept for the value in an eq filter
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _coerce(sample: Any, text: str) -> Any:
+    # filter values arrive as text; compare them as the column's type
+    if isinstance(sample, bool):
+        return text.lower() == "true"
+    if isinstance(sample, int):
+        try:
+            return int(text)
+        except ValueError:
+            return text
+    if isinstance(sample, float):
+        try:
+            return float(text)
+        except ValueError:
+            return text
+    return text
+
+
+def _like(pattern: str, flags: int = 0) -> "re.Pattern[str]":
+    regex = "".join(".*" if ch in "%*" else "." if ch == "_" else re.escape(ch) for ch in pattern)
+    return re.compile(f"^{regex}$", flags | re.DOTALL)
+
+
+def _in_values(text: str) -> List[str]:
+    inner = text.strip()
+    if inner.startswith("(") and inner.endswith(")"):
+        inner = inner[1:-1]
+    return [v.strip().strip('"') for v in inner.split(",") if v.strip()]
+
+
+def _matches(value: Any, op: str, arg: str) -> bool:
+    if op == "is":
+        return {"null": value is None, "true": value is True, "false": value is False}.get(arg.lower(), False)
+    if value is None:
+        return False
+    if op == "in":
+        return value in {_coerce(value, v) for v in _in_values(arg)}
+    if op in ("like", "ilike"):
+        return bool(_like(arg, re.IGNORECASE if op == "ilike" else 0).match(str(value)))
+
+    target = _coerce(value, arg)
+    if type(target) is not type(value) and not (isinstance(value, (int, float)) and isinstance(target, (int, float))):
+        value, target = str(value), str(target)
+    if op == "eq":
+        return value == target
+    if op == "neq":
+        return value != target
+    if op == "gt":
+        return value > target
+    if op == "gte":
+        return value >= target
+    if op == "lt":
+        return value < target
+    return value <= target  # lte
+
+
+def parse_filter(raw: str) -> Tuple[bool, str, str]:
+    negate = raw.startswith("not.")
+    if negate:
+        raw = raw[4:]
+    op, _, arg = raw.partition(".")
+    if op not in FILTER_OPS:
+        raise PostgrestError(400, "PGRST100", f'"failed to parse filter ({raw})"')
+    return negate, op, arg
+
+
+def _sort(rows: List[Dict[str, Any]], order: str) -> List[Dict[str, Any]]:
+    # applied last key first so earlier keys win; nulls go last ascending and first descending like Postgres
+    for term in reversed(order.split(",")):
+        column, *modifiers = term.strip().split(".")
+        descending = "desc" in modifiers
+        nulls_first = "nullsfirst" in modifiers or (descending and "nullslast" not in modifiers)
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: r[column], reverse=descending)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+class LocalSupabase:
+    # thread-safe: the HTTP server handles requests on several threads
+
+    def __init__(
+        self,
+        tables: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+    ):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: List[Tuple[str, str]] = []
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._indexes: Dict[Tuple[str, str], Dict[Any, List[int]]] = {}
+
+    @classmethod
+    def from_fixture(cls, path: Any, **kwargs: Any) -> "LocalSupabase":
+        return cls(json.loads(Path(path).read_text()), **kwargs)
+
+    @property
+    def round_trips(self) -> int:
+        return len(self.calls)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    # ---- lookups
+
+    def _table(self, name: str) -> List[Dict[str, Any]]:
+        if name not in self.tables:
+            raise PostgrestError(404, "PGRST205", f"Could not find the table 'public.{name}' in the schema cache")
+        return self.tables[name]
+
+    def _index(self, table: str, column: str) -> Dict[Any, List[int]]:
+        # equality index keyed by the text form of the value, since filters arrive as text; dropped on every write
+        key = (table, column)
+        if key not in self._indexes:
+            index: Dict[Any, List[int]] = {}
+            for pos, row in enumerate(self.tables[table]):
+                index.setdefault(_index_key(row.get(column)), []).append(pos)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _invalidate(self, table: str) -> None:
+        for key in [k for k in self._indexes if k[0] == table]:
+            del self._indexes[key]
+
+    def _filtered(self, table: str, filters: Sequence[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        rows = self._table(table)
+        parsed = [(column, *parse_filter(raw)) for column, raw in filters]
+
+        # narrow with the first positive eq/in filter through the index, then scan the rest
+        for column, negate, op, arg in parsed:
+            if not negate and op in ("eq", "in"):
+                index = self._index(table, column)
+                keys = [arg] if op == "eq" else _in_values(arg)
+                positions = sorted({pos for k in keys for pos in index.get(k, ())})
+                rows = [rows[pos] for pos in positions]
+                break
+
+        return [
+            row for row in rows
+            if all(_matches(row.get(column), op, arg) != negate for column, negate, op, arg in parsed)
+        ]
+
+    def _relationship(self, table: str, target: str) -> Tuple[str, str, bool]:
+        # returns (column on this table, column on the target, many); the FK can point either way
+        for column, parent in FOREIGN_KEYS.get(target, {}).items():
+            if parent == table:
+                return column, column, True
+        for column, parent in FOREIGN_KEYS.get(table, {}).items():
+            if parent == target:
+                return column, column, False
+        raise PostgrestError(
+            400,
+            "PGRST200",
+            f"Could not find a relationship between '{table}' and '{target}' in the schema cache",
+        )
+
+    def _project(self, table: str, row: Dict[str, Any], fields: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        out: Dict[str, Any] = {}
+        for field in fields:
+            if "fields" not in field:
+                if field["name"] == "*":
+                    out.update(row)
+                else:
+                    out[field["alias"]] = row.get(field["name"])
+                continue
+
+            local, remote, many = self._relationship(table, field["name"])
+            params = field.get("params", [])
+            options = {k: v for k, v in params if k in RESERVED_PARAMS}
+            filters = [(remote, f"eq.{row.get(local)}")] + [(k, v) for k, v in params if k not in RESERVED_PARAMS]
+            children = self._filtered(field["name"], filters) if row.get(local) is not None else []
+            if many and [f["name"] for f in field["fields"]] == ["count"]:
+                out[field["alias"]] = [{"count": len(children)}]  # alias(count): one row holding the count
+                continue
+            if options.get("order"):
+                children = _sort(children, options["order"])
+            offset = int(options.get("offset", 0))
+            limit = options.get("limit")
+            children = children[offset:offset + int(limit)] if limit is not None else children[offset:]
+            projected = [p for p in (self._project(field["name"], c, field["fields"]) for c in children) if p is not None]
+            if field["inner"] and not projected:
+                return None
+            out[field["alias"]] = projected if many else (projected[0] if projected else None)
+        return out
+
+    # ---- operations
+
+    def select(self, table: str, params: Sequence[Tuple[str, str]]) -> Tuple[List[Dict[str, Any]], int]:
+        fields = parse_select(dict(params).get("select", "*"))
+        # "alias.param" applies param to that embed, e.g. latest.order=added_at.desc or latest.limit=1
+        embeds = {f["alias"]: f for f in fields if "fields" in f}
+        top: List[Tuple[str, str]] = []
+        for k, v in params:
+            alias, _, rest = k.partition(".")
+            if rest and alias in embeds:
+                embeds[alias].setdefault("params", []).append((rest, v))
+            else:
+                top.append((k, v))
+        options = {k: v for k, v in top if k in RESERVED_PARAMS}
+        filters = [(k, v) for k, v in top if k not in RESERVED_PARAMS]
+
+        with self._lock:
+            rows = self._filtered(table, filters)
+            if options.get("order"):
+                rows = _sort(rows, options["order"])
+            projected = [p for p in (self._project(table, r, fields) for r in rows) if p is not None]
+
+        total = len(projected)
+        offset = int(options.get("offset", 0))
+        limit = options.get("limit")
+        page = projected[offset:offset + int(limit)] if limit is not None else projected[offset:]
+        return page, total
+
+    def insert(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: Optional[str] = None,
+        resolution: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        conflict = tuple(c.strip() for c in on_conflict.split(",")) if on_conflict else PRIMARY_KEYS.get(table)
+        written: List[Dict[str, Any]] = []
+
+        with self._lock:
+            stored = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                for column, default in DEFAULTS.get(table, {}).items():
+                    row.setdefault(column, default())
+
+                existing = None
+                if conflict:
+                    matches = self._filtered(table, [(c, f"eq.{row.get(c)}") for c in conflict])
+                    existing = matches[0] if matches else None
+
+                if existing is None:
+                    stored.append(row)
+                    written.append(row)
+                elif resolution == "merge-duplicates":
+                    existing.update(row)
+                    written.append(existing)
+                elif resolution != "ignore-duplicates":
+                    raise PostgrestError(
+                        409,
+                        "23505",
+                        f'duplicate key value violates unique constraint "{table}_pkey"',
+                        f"Key ({', '.join(conflict)}) already exists.",
+                    )
+                self._invalidate(table)
+        return [dict(r) for r in written]
+
+    def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        if function != RPC_NAME:
+            raise PostgrestError(404, "PGRST202", f"Could not find the function public.{function} in the schema cache")
+        user_id = str(params.get("p_user_id"))
+        limit = int(params.get("p_limit", 100))
+        with self._lock:
+            shelves = self._filtered("shelves", [("user_id", f"eq.{user_id}")])
+            shelf_ids = ",".join(str(s["shelf_id"]) for s in shelves)
+            items = self._filtered("shelf_items", [("shelf_id", f"in.({shelf_ids})")]) if shelf_ids else []
+            work_ids = ",".join({str(i["work_id"]) for i in items})
+            editions = self._filtered("editions", [("work_id", f"in.({work_ids})")]) if work_ids else []
+        return shelf_overview_local(user_id, shelves, items, editions, limit)
+
+    # ---- HTTP
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        params: Sequence[Tuple[str, str]],
+        headers: Dict[str, str],
+        body: bytes,
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        # one PostgREST request in, (status, headers, body) out
+        method = method.upper()
+        resource = path.split("/rest/v1/", 1)[-1].strip("/")
+        headers = {k.lower(): v for k, v in headers.items()}
+        prefer = {p.strip() for p in headers.get("prefer", "").split(",") if p.strip()}
+        with self._lock:
+            self.calls.append((method, resource))
+
+        try:
+            if resource.startswith("rpc/"):
+                args = dict(params) if method in ("GET", "HEAD") else json.loads(body or b"{}")
+                return self._respond(method, 200, self.rpc(resource[4:], args))
+
+            if method in ("GET", "HEAD"):
+                rows, total = self.select(resource, params)
+                offset = int(dict(params).get("offset", 0))
+                count = str(total) if "count=exact" in prefer else "*"
+                content_range = f"{offset}-{offset + len(rows) - 1}/{count}" if rows else f"*/{count}"
+                if SINGLE_OBJECT in headers.get("accept", ""):
+                    if len(rows) != 1:
+                        raise PostgrestError(406, "PGRST116", "JSON object requested, multiple (or no) rows returned")
+                    return self._respond(method, 200, rows[0], {"Content-Range": content_range})
+                return self._respond(method, 200, rows, {"Content-Range": content_range})
+
+            if method == "POST":
+                payload = json.loads(body or b"[]")
+                rows = payload if isinstance(payload, list) else [payload]
+                resolution = next((p.split("=", 1)[1] for p in prefer if p.startswith("resolution=")), None)
+                written = self.insert(resource, rows, dict(params).get("on_conflict"), resolution)
+                if "return=representation" in prefer:
+                    return self._respond(method, 201, written)
+                return self._respond(method, 201, None)
+
+            raise PostgrestError(405, "PGRST117", f"Unsupported HTTP method: {method}")
+        except PostgrestError as e:
+            return self._respond(method, e.status, e.body())
+        except ValueError as e:
+            return self._respond(method, 400, PostgrestError(400, "PGRST100", str(e)).body())
+
+    @staticmethod
+    def _respond(method: str, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        headers = {"Content-Type": "application/json; charset=utf-8", **(headers or {})}
+        body = b"" if payload is None or method == "HEAD" else json.dumps(payload).encode()
+        return status, headers, body
+
+
+class LocalSupabaseTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    # answers httpx requests from a LocalSupabase without a socket; usable by sync and async clients
+
+    def __init__(self, backend: LocalSupabase):
+        self.backend = backend
+
+    def _call(self, request: httpx.Request) -> httpx.Response:
+        status, headers, body = self.backend.handle(
+            request.method,
+            request.url.path,
+            request.url.params.multi_items(),
+            dict(request.headers),
+            request.read(),
+        )
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.backend.delay())
+        return self._call(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.backend.delay())
+        return self._call(request)
+
+
+LOCAL_URL = "http://local.supabase"
+LOCAL_KEY = "local-service-role-key"
+
+
+def install(backend: LocalSupabase) -> LocalSupabaseTransport:
+    # points supabaseRest's async client and the supabase-py client at the backend, in this process
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    transport = LocalSupabaseTransport(backend)
+    supabaseRest.SUPABASE_URL = LOCAL_URL
+    supabaseRest.SUPABASE_KEY = LOCAL_KEY
+    supabaseRest._client = httpx.AsyncClient(base_url=f"{LOCAL_URL}/rest/v1", transport=transport)
+    supabaseRest._sync_client = create_client(
+        LOCAL_URL,
+        LOCAL_KEY,
+        SyncClientOptions(httpx_client=httpx.Client(transport=transport)),
+    )
+    return transport
+
+
+def serve(backend: LocalSupabase, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    # serves the backend over HTTP on a daemon thread; the bound address is server.server_address
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self) -> None:
+            url = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            time.sleep(backend.delay())
+            status, headers, payload = backend.handle(
+                self.command, url.path, parse_qsl(url.query, keep_blank_values=True), dict(self.headers), body
+            )
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(payload)
+
+        do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = _dispatch
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a fixture through a local PostgREST stand-in")
+    parser.add_argument("--fixture", type=Path, required=True, help="fixture.json from app.syntheticData")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds, up to this much")
+    args = parser.parse_args(argv)
+
+    backend = LocalSupabase.from_fixture(args.fixture, latency=args.latency, jitter=args.jitter)
+    server = serve(backend, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"[local_supabase] serving {len(backend.tables)} tables on http://{host}:{port}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[local_supabase] {backend.round_trips} requests so far")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from .security import get_current_user
+from .recommendML.cf_model import load_cf_model
+from .recommendML.als_model import load_als_model
+from .supabaseRest import close_client
+from .chartWorkers import chart_workers
+from .referenceData import reference_data
 from . import home
 from . import recommendRoutes
 from . import readingChallenge
 from . import profileStats
+from . import genreRoutes
 
-app = FastAPI(title="Beyond the Bookshelf - API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        load_cf_model()
+    except Exception as e:
+        print("[startup] collaborative filtering model not loaded:", repr(e))
+    try:
+        load_als_model()  # trains the factors here when the saved ones are stale, never inside a request
+    except Exception as e:
+        print("[startup] ALS model not loaded:", repr(e))
+    try:
+        await reference_data.load()
+    except Exception as e:
+        print("[startup] reference data not loaded, loading on first use:", repr(e))
+    reference_data.start()
+    chart_workers.start()
+    yield
+    chart_workers.shutdown()
+    await reference_data.stop()
+    await close_client()
+
+
+app = FastAPI(title="Beyond the Bookshelf - API", version="0.1.0", lifespan=lifespan)
 api = APIRouter()
 
 ALLOWED_ORIGINS = [
@@ -39,3 +69,4 @@ app.include_router(api, prefix="/api")
 app.include_router(home.router)
 app.include_router(readingChallenge.router)
 app.include_router(profileStats.router)
+app.include_router(genreRoutes.router)
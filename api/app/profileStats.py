@@ -1,45 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-from .userMatplotlib import create_yearly_charts
+import asyncio
+import hashlib
+import json
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+from .chartService import etag_matches, get_chart
+from .chartWorkers import ChartBusy
+from .readingStats import MAX_STATS_YEARS, get_year_stats
 from .security import get_current_user
 
 router = APIRouter(prefix="/api/home", tags=["profile-stats"])
 
+# browsers revalidate every time; an unchanged chart then costs a 304 with no body
+CHART_CACHE_CONTROL = "private, no-cache"
 
-@router.get("/stats/{year}/pages")
-async def get_pages_chart(year: int, user: dict = Depends(get_current_user)):
+
+async def chart_response(user: dict, year: int, kind: str, if_none_match: Optional[str], missing_detail: str) -> Response:
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    charts = create_yearly_charts(user_id=user["id"], year=year)
+    try:
+        chart = await get_chart(user["id"], year, kind, if_none_match)
+    except ChartBusy as e:
+        print("[profile_stats] render queue full:", e)
+        raise HTTPException(status_code=503, detail="Charts are busy, try again shortly", headers={"Retry-After": "2"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Rendering the chart took too long")
+    except BrokenProcessPool as e:
+        print("[profile_stats] chart workers unavailable:", repr(e))
+        raise HTTPException(status_code=503, detail="Charts are unavailable, try again shortly", headers={"Retry-After": "2"})
+    if chart is None:
+        raise HTTPException(status_code=404, detail=missing_detail)
+
+    etag, png = chart
+    headers = {"ETag": etag, "Cache-Control": CHART_CACHE_CONTROL}
+    if png is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=png, media_type="image/png", headers=headers)
 
-    if not charts or "pages" not in charts:
-        raise HTTPException(status_code=404, detail="No reading data for that year")
 
-    return FileResponse(charts["pages"], media_type="image/png")
+@router.get("/stats/{year}/pages")
+async def get_pages_chart(
+    year: int,
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    return await chart_response(user, year, "pages", if_none_match, "No reading data for that year")
 
 
 @router.get("/stats/{year}/genres")
-async def get_genres_chart(year: int, user: dict = Depends(get_current_user)):
-    if not user:
-        raise HTTPException(status_code=403, detail="Not authenticated")
-
-    charts = create_yearly_charts(user_id=user["id"], year=year)
-
-    if not charts or "genres" not in charts:
-        raise HTTPException(status_code=404, detail="No genre data for that year")
-
-    return FileResponse(charts["genres"], media_type="image/png")
+async def get_genres_chart(
+    year: int,
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    return await chart_response(user, year, "genres", if_none_match, "No genre data for that year")
 
 
 @router.get("/stats/{year}/timeline")
-async def get_timeline_chart(year: int, user: dict = Depends(get_current_user)):
+async def get_timeline_chart(
+    year: int,
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    return await chart_response(user, year, "timeline", if_none_match, "No completion data for that year")
+
+
+@router.get("/stats")
+async def get_stats(
+    years: Optional[List[int]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    # the chart series as JSON (a few hundred bytes per year), for the client to draw; defaults to this year
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    charts = create_yearly_charts(user_id=user["id"], year=year)
-
-    if not charts or "timeline" not in charts:
-        raise HTTPException(status_code=404, detail="No completion data for that year")
+    years = years or [date.today().year]
+    if len(set(years)) > MAX_STATS_YEARS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_YEARS} years per request")
 
-    return FileResponse(charts["timeline"], media_type="image/png")
+    body = json.dumps({"years": await get_year_stats(user["id"], years)}, separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": CHART_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,25 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from .security import get_current_user
-import os
-import json
-import urllib.request
-import urllib.parse
-import urllib.error
+from .readingStats import get_year_stats
+from .supabaseRest import SupabaseError, gather_queries, insert, select, to_http_exception
 
 router = APIRouter(prefix="/api/reading-challenge", tags=["reading-challenge"])
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-
-def supabase_headers() -> dict:
-    return {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
-
 
 @router.get("/current")
 async def reading_challenge_current(
@@ -29,7 +14,6 @@ async def reading_challenge_current(
     if not user:
         raise HTTPException(status_code=403, detail="Not authenticated")
 
-    headers = supabase_headers()
     user_id = user["id"]
     chal_params = {
         "select": "target_count",
@@ -37,77 +21,21 @@ async def reading_challenge_current(
         "year": f"eq.{year}",
         "limit": "1",
     }
-    chal_url = (
-        f"{SUPABASE_URL}/rest/v1/reading_challenges?"
-        f"{urllib.parse.urlencode(chal_params)}"
-    )
-    target_count = None
-
-    try:
-        chal_req = urllib.request.Request(chal_url, headers=headers, method="GET")
-        with urllib.request.urlopen(chal_req, timeout=10) as resp:
-            chal_body = resp.read().decode("utf-8")
-        chal_rows = json.loads(chal_body)
-        if chal_rows:
-            target_count = chal_rows[0].get("target_count")
-
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[reading_challenge] reading_challenges HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                f"Supabase error while reading reading_challenges "
-                f"({e.code}): {body}"
-            ),
-        )
-
-    except Exception as e:
-        print("[reading_challenge] reading_challenges error:", repr(e))
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to load reading challenge",
-        )
-
-    start = f"{year}-01-01"
-    end = f"{year + 1}-01-01"
-    comp_params = [
-        ("select", "work_id,finished_at"),
-        ("user_id", f"eq.{user_id}"),
-        ("finished_at", f"gte.{start}"),
-        ("finished_at", f"lt.{end}"),
-        ("limit", "10000"),
-    ]
-    comp_url = (
-        f"{SUPABASE_URL}/rest/v1/completions?"
-        f"{urllib.parse.urlencode(comp_params)}"
-    )
-    completed_count = 0
 
+    # the challenge row and the year's stats do not depend on each other
     try:
-        comp_req = urllib.request.Request(comp_url, headers=headers, method="GET")
-        with urllib.request.urlopen(comp_req, timeout=10) as resp:
-            comp_body = resp.read().decode("utf-8")
-        comp_rows = json.loads(comp_body)
-        completed_count = len(comp_rows)
-
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="ignore")
-        print("[reading_challenge] completions HTTPError", e.code, body)
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                f"Supabase error while reading completions "
-                f"({e.code}): {body}"
-            ),
+        results = await gather_queries(
+            {
+                "challenge": select("reading_challenges", chal_params),
+                "stats": get_year_stats(user_id, [year], counts_only=True),
+            }
         )
+    except SupabaseError as e:
+        raise to_http_exception(e, "reading_challenge")
 
-    except Exception as e:
-        print("[reading_challenge] completions error:", repr(e))
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to load completions",
-        )
+    chal_rows = results["challenge"]
+    target_count = chal_rows[0].get("target_count") if chal_rows else None
+    completed_count = results["stats"][0]["book_count"]
 
     return {
         "year": year,
@@ -139,44 +67,22 @@ async def update_reading_challenge_current(
             detail="target_count must be positive",
         )
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates,return=representation",
-    }
     supabase_row = {
         "user_id": user["id"],
         "year": year,
         "target_count": target_count,
     }
-    base_url = f"{SUPABASE_URL}/rest/v1/reading_challenges"
-    query = urllib.parse.urlencode({"on_conflict": "user_id,year"})
-    url = f"{base_url}?{query}"
-    data = json.dumps(supabase_row).encode("utf-8")
 
     try:
-        req = urllib.request.Request(url, data=data, headers=headers, method="POST")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = resp.read().decode("utf-8", errors="ignore")
-            print("[reading_challenge] upsert OK:", resp.status, body)
-
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode("utf-8", errors="ignore")
-        print("[reading_challenge] upsert HTTPError:", e.code, error_body)
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "Supabase error while saving reading_challenges "
-                f"({e.code}): {error_body}"
-            ),
+        rows = await insert(
+            "reading_challenges",
+            supabase_row,
+            params={"on_conflict": "user_id,year"},
+            prefer="resolution=merge-duplicates,return=representation",
         )
+        print("[reading_challenge] upsert OK:", rows)
 
-    except Exception as e:
-        print("[reading_challenge] upsert error:", repr(e))
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to save reading challenge",
-        )
+    except SupabaseError as e:
+        raise to_http_exception(e, "reading_challenge", action="saving")
 
     return await reading_challenge_current(year=year, user=user)
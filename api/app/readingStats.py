@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from .supabaseRest import SupabaseError, count, is_missing_table, select
+from .userMatplotlib import fetch_year_data
+
+# sql/user_year_stats.sql: one row per (user, year), kept current by triggers on completions
+STATS_TABLE = "user_year_stats"
+STATS_COLUMNS = "year,book_count,page_count,pages_per_month,genre_counts,finished"
+RETRY_MISSING_AFTER = 600
+MAX_STATS_YEARS = 10
+
+_missing_since: Optional[float] = None
+
+
+def empty_stats(year: int) -> Dict[str, Any]:
+    return {"year": year, "book_count": 0, "page_count": 0, "pages_per_month": [0] * 12, "genres": [], "finished": []}
+
+
+def _genre_list(counts: Dict[str, int]) -> List[Dict[str, Any]]:
+    # most read first, ties by name, so equal data always serializes (and hashes) the same
+    ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return [{"name": name, "count": int(n)} for name, n in ordered if n > 0]
+
+
+def year_stats(completions_df: pd.DataFrame, work_genres_df: pd.DataFrame, year: int) -> Dict[str, Any]:
+    # the series behind the three profile charts: monthly page sums, the genre histogram and the finish dates
+    if completions_df.empty:
+        return empty_stats(year)
+
+    finished = completions_df["finished_at"]
+    pages = completions_df["page_count"].to_numpy(dtype=np.float64)
+    pages_per_month = np.bincount(finished.dt.month.to_numpy() - 1, weights=pages, minlength=12)
+
+    genre_counts: Dict[str, int] = {}
+    if not work_genres_df.empty:
+        read = work_genres_df[work_genres_df["work_id"].isin(completions_df["work_id"].unique())]
+        genre_counts = read["name"].dropna().value_counts().to_dict()
+
+    return {
+        "year": year,
+        "book_count": int(len(completions_df)),
+        "page_count": int(pages.sum()),
+        "pages_per_month": pages_per_month.astype(np.int64).tolist(),
+        "genres": _genre_list(genre_counts),
+        "finished": np.sort(finished.dt.strftime("%Y-%m-%d").to_numpy()).tolist(),
+    }
+
+
+def stats_from_row(row: Optional[Dict[str, Any]], year: int) -> Dict[str, Any]:
+    # a user_year_stats row in year_stats' shape; no row means nothing was finished that year
+    if not row:
+        return empty_stats(year)
+    return {
+        "year": year,
+        "book_count": row.get("book_count") or 0,
+        "page_count": row.get("page_count") or 0,
+        "pages_per_month": list(row.get("pages_per_month") or [0] * 12),
+        "genres": _genre_list(row.get("genre_counts") or {}),
+        "finished": sorted(str(ts)[:10] for ts in row.get("finished") or []),
+    }
+
+
+def _materialized_available() -> bool:
+    return _missing_since is None or time.monotonic() - _missing_since >= RETRY_MISSING_AFTER
+
+
+async def get_year_stats(user_id: str, years: Iterable[int], counts_only: bool = False) -> List[Dict[str, Any]]:
+    # the one read path for a user's yearly reading stats (profile stats, charts, reading challenge), ordered by year.
+    # normally a single primary-key read of user_year_stats; until that table exists the years are computed from
+    # completions. counts_only callers need book_count alone, which the fallback then gets from a HEAD count
+    global _missing_since
+    years = sorted(set(years))
+    if not years:
+        return []
+
+    if _materialized_available():
+        try:
+            rows = await select(
+                STATS_TABLE,
+                {"select": STATS_COLUMNS, "user_id": f"eq.{user_id}", "year": f"in.({','.join(map(str, years))})"},
+            )
+        except SupabaseError as e:
+            if not is_missing_table(e):
+                raise
+            print(f"[reading_stats] {STATS_TABLE} is not deployed, computing stats from completions")
+            _missing_since = time.monotonic()
+        else:
+            _missing_since = None
+            by_year = {row.get("year"): row for row in rows}
+            return [stats_from_row(by_year.get(year), year) for year in years]
+
+    async def one(year: int) -> Dict[str, Any]:
+        if counts_only:
+            total = await count(
+                "completions",
+                [("user_id", f"eq.{user_id}"), ("finished_at", f"gte.{year}-01-01"), ("finished_at", f"lt.{year + 1}-01-01")],
+            )
+            return {**empty_stats(year), "book_count": total}
+        # the supabase-py client blocks, so each year is read on its own thread
+        completions_df, work_genres_df = await asyncio.to_thread(fetch_year_data, user_id, year)
+        return year_stats(completions_df, work_genres_df, year)
+
+    return list(await asyncio.gather(*(one(year) for year in years)))
@@ -3,18 +3,32 @@
 # Content-Based Modeling using both TF-IDF and Text Embeddings via Bert
 
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity 
 from sklearn.feature_extraction.text import TfidfVectorizer
 # import tensorflow as tf
 # import tensorflow_hub as hub
 # from transformers import BertTokenizer, TFBertModel #pip install transformers==4.41.2
 import numpy as np  
 import pickle
+import os
+import pyarrow as pa
+from sklearn.preprocessing import normalize
 from pathlib import Path
 from functools import lru_cache
+from .vector_index import build_index, top_k
+from .content_artifacts import ARTIFACT_DIR, ArtifactError, load_content_artifacts, save_content_artifacts
+from .embedding_service import get_embedding_service
+from .embedding_builder import build_embeddings
+from .candidates import Candidates, SOURCE_CONTENT
 
 BASE_DIR = Path(__file__).resolve().parent
 
+#"exact", "ivf" or "auto"; nprobe is the recall vs latency knob of the ivf index
+CONTENT_INDEX_MODE = os.getenv("CONTENT_INDEX_MODE", "auto")
+CONTENT_INDEX_NPROBE = int(os.getenv("CONTENT_INDEX_NPROBE", "8"))
+CONTENT_ARTIFACT_DIR = Path(os.getenv("CONTENT_ARTIFACT_DIR", str(ARTIFACT_DIR)))
+CANDIDATE_FACTOR = 10 #approximate searches over-fetch so the combined score can re-rank
+NO_WORK_ID = 0 #catalogue rows whose title is not in works.csv
+
 
 @lru_cache(maxsize=None)
 def getCSVdf  (filename, encoding_type = "utf-8"):
@@ -24,34 +38,20 @@ def getCSVdf  (filename, encoding_type = "utf-8"):
     return book_dataframe
 
 
-def get_BERT_embeds (text, batch_size = 1000):
-    "When given text, this method uses the uncased BERT model to create an array of the created embeddings."
+def work_ids_for_titles(titles):
+    "This method maps catalogue titles to works.csv work_ids (uint64), NO_WORK_ID where there is no match."
+    works = getCSVdf("works.csv").drop_duplicates("title")
+    by_title = dict(zip(works["title"], works["work_id"].to_numpy(dtype=np.uint64)))
+    #ids need all 64 bits, so they must not pass through a float column
+    return np.fromiter((by_title.get(t, NO_WORK_ID) for t in titles), dtype=np.uint64)
 
-    #BERT Tokenizer & Model via HuggingFace and Tensorflow
-    #was originally tensorflow model -- but had to downgrade python to use it
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-    model = TFBertModel.from_pretrained("bert-base-uncased", from_pt=True)
-    
-    #need batch size otherwise it will overload CPU --do it in parts
-    bert = []
-    ##ran into error; where the value was not a str, but was expecting one
-    cleaned_texts = []
-    for t in text:
-        if pd.notna(t): #if its not na or null
-            if isinstance(t, str): #if t is a str
-                cleaned_texts.append(t)
-            else:
-                cleaned_texts.append(str(t))
-        else:
-            cleaned_texts.append("")
-    
-    for i in range(0, len(text), batch_size):
-        batch = cleaned_texts[i:i+ batch_size] #start from i then cont until batch size
-        encodings = tokenizer(batch, padding=True, truncation=True,return_tensors="tf", max_length=512)
-        outputs = model(encodings)
-        embedding_batch = outputs.pooler_output #no longer need iterate w/ huggingface outputs
-        bert.append(embedding_batch.numpy())
-    return np.vpstack(bert)
+
+def with_work_ids(BookDetails):
+    "Adds the work_id column to metadata built before it was stored (matched on title once, at load time)."
+    if "work_id" in BookDetails.column_names:
+        return BookDetails
+    work_ids = work_ids_for_titles(BookDetails.column("title").to_pylist())
+    return BookDetails.append_column("work_id", pa.array(work_ids, type=pa.uint64()))
 
 
 #TF-IDF Vectorization
@@ -63,7 +63,7 @@ def get_TFIDF_Vector(text, maxfeat = 2000):
 
 
 def getDF_matricies(filename = "book_details.csv"):
-    "This method gets the matricies, embeddings, and related vectors of the original dataset and saves them within pickle files."
+    "This method gets the matricies, embeddings, and related vectors of the original dataset and saves them as memory-mapped artifacts."
     df = getCSVdf(filename, "latin1")
 
     #for warning for trying to set on a copy
@@ -76,26 +76,47 @@ def getDF_matricies(filename = "book_details.csv"):
 
     BookDetails_df['genres'] = BookDetails_df['genres'].fillna('') #TF-IDF
     BookDetails_df['author'] = BookDetails_df['author'].fillna('')
+    BookDetails_df['work_id'] = work_ids_for_titles(BookDetails_df['title']) #results carry ids, not titles
 
-    #only the title and the description will be embedded 
-    bert_inputs = (df['title'] + ' ' + df['description']).tolist() #list of the titles and descriptions of books
-    embeddings = get_BERT_embeds(bert_inputs, 512)
+    #only the title and the description will be embedded; rows embedded by an earlier run are reused
+    embeddings = build_embeddings(BookDetails_df, shard_size=512)
     tfidf_texts  = (BookDetails_df['genres'] + ' ' + BookDetails_df['author']).tolist()
     vectorizer, vector_Matrix= get_TFIDF_Vector(tfidf_texts)
 
-    with open("book_embeddings.pkl", "wb") as f:
-        pickle.dump(embeddings, f)
-    with open("tfidf_matrix.pkl", "wb") as f:
-        pickle.dump(vector_Matrix, f)
-    with open("tfidf_vectorizer.pkl", "wb") as f:
-        pickle.dump(vectorizer, f)
-    with open("book_details.pkl", "wb") as f:
-        pickle.dump(BookDetails_df, f)
+    save_content_artifacts(embeddings, vector_Matrix, vectorizer, BookDetails_df)
 
 
-@lru_cache(maxsize=1)
 def load_matricies():
-    "This method loads the associated matrices and dataframes associated with the original dataset."
+    "This method loads the associated matrices (as L2 normalized float32 rows) and the book metadata as an Arrow table."
+    matrices, error = _load_outcome()
+    if error is not None:
+        raise ArtifactError(f"content artifacts unavailable: {error!r}") from error
+    return matrices
+
+
+def content_ready():
+    "False once loading the matrices has failed, so callers can skip the content engine without a warning per request."
+    return _load_outcome()[1] is None
+
+
+@lru_cache(maxsize=1)
+def _load_outcome():
+    "(matrices, None) or (None, the load error); a missing deploy is remembered too, so requests do not retry it."
+    try:
+        return _read_matricies(), None
+    except Exception as e:
+        print("[content] content engine disabled until reset_content_caches():", repr(e))
+        return None, e
+
+
+def _read_matricies():
+    try:
+        embeddings, vector_Matrix, vectorizer, BookDetails, manifest = load_content_artifacts(CONTENT_ARTIFACT_DIR)
+        return embeddings, vector_Matrix, vectorizer, with_work_ids(BookDetails)
+    except ArtifactError as e:
+        print("[content] memory-mapped artifacts unavailable, reading pickles:", e)
+
+    #older deploys only have the pickles; run content_artifacts.convert_pickles() to migrate them
     with open(BASE_DIR / "book_embeddings.pkl", "rb") as f:
         embeddings = pickle.load(f)
     with open(BASE_DIR / "tfidf_matrix.pkl", "rb") as f:
@@ -104,35 +125,113 @@ def load_matricies():
         vectorizer = pickle.load(f)
     with open(BASE_DIR / "book_details.pkl", "rb") as f:
         BookDetails_df = pickle.load(f)
-    return embeddings, vector_Matrix, vectorizer, BookDetails_df
+    embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+    vector_Matrix = normalize(vector_Matrix.astype(np.float32))
+    BookDetails = pa.Table.from_pandas(BookDetails_df.reset_index(drop=True), preserve_index=False)
+    return embeddings, vector_Matrix, vectorizer, with_work_ids(BookDetails)
 
 
-def recommend_content(title=None, description=None, genres=None, author=None, top_n=5):
-    "This method returns suggested books based off of a given title, description, genre, or author."
-    embeddings, vector_Matrix, vectorizer, BookDetails_df = load_matricies()
+@lru_cache(maxsize=1)
+def load_content_indexes(mode=CONTENT_INDEX_MODE):
+    "This method builds the BERT and TF-IDF vector indexes from the saved matrices, once per process."
+    embeddings, vector_Matrix, vectorizer, BookDetails = load_matricies()
+    return build_index(embeddings, mode, normalized=True), build_index(vector_Matrix, mode, normalized=True)
+
+
+@lru_cache(maxsize=4)
+def load_text_index(encoder_name, mode=CONTENT_INDEX_MODE):
+    "This method returns the title/description index matching the query encoder, embedding the catalogue when the fallback encoder is in use."
+    embeddings, vector_Matrix, vectorizer, BookDetails = load_matricies()
+    if encoder_name == "bert":
+        return load_content_indexes(mode)[0]
+
+    encoder = get_embedding_service().encoder
+    titles = BookDetails.column("title").to_pylist()
+    descriptions = BookDetails.column("description").to_pylist()
+    texts = [f"{t or ''} {d or ''}" for t, d in zip(titles, descriptions)]
+    fallback_embeddings = np.vstack([encoder.encode(texts[i:i + 4096]) for i in range(0, len(texts), 4096)])
+    return build_index(fallback_embeddings, mode, normalized=True)
+
+
+def search_content(queries, top_n, nprobe=None):
+    "When given (index, query vector) pairs, this method returns the rows with the best average similarity across them and those similarities."
+    if all(index.exhaustive for index, query in queries):
+        combined_sim = sum(index.similarity(query) for index, query in queries) / len(queries)
+        rows = top_k(combined_sim, top_n)
+        return rows, combined_sim[rows]
+
+    #approximate indexes only see their own space, so pool each one's candidates and score them exactly
+    candidates = np.unique(np.concatenate([
+        index.search(query, top_n * CANDIDATE_FACTOR, nprobe)[0] for index, query in queries
+    ]))
+    combined_sim = sum(index.similarity(query, candidates) for index, query in queries) / len(queries)
+    best = top_k(combined_sim, top_n)
+    return candidates[best], combined_sim[best]
+
+
+def search_catalogue(title=None, description=None, genres=None, author=None, top_n=5, nprobe=CONTENT_INDEX_NPROBE):
+    "This method returns the catalogue rows (and their similarities) closest to a given title, description, genre, or author."
+    embeddings, vector_Matrix, vectorizer, BookDetails = load_matricies()
+    bert_index, tfidf_index = load_content_indexes()
+    queries = []
     
     if title or description: #Bert Fields
-        bert_input = [f"{title or ''} {description or ''}"]
-        new_bert_embed = get_BERT_embeds(bert_input, batch_size=1)
-        bert_sim = cosine_similarity(new_bert_embed, (embeddings))[0]
-    else:
-        bert_sim = np.zeros(len(BookDetails_df))
+        service = get_embedding_service() #model loaded once, queries batched and cached
+        new_bert_embed = service.embed(f"{title or ''} {description or ''}")
+        queries.append((load_text_index(service.encoder.name), new_bert_embed))
     
     if genres or author: #Genres & Author Fields (TF-IDF Section)
         tfidf_input = [f"{genres or ''} {author or ''}"]
         new_tfidf_vector = vectorizer.transform(tfidf_input) #was expecting array not tuple
-        tfidf_sim = cosine_similarity(new_tfidf_vector, vector_Matrix)[0]
-    else:
-        tfidf_sim = np.zeros(len(BookDetails_df))
-
-    num_sources = int(bool(title or description)) + int(bool(genres or author))
-    if num_sources > 0:
-        combined_sim = (bert_sim + tfidf_sim) / num_sources
-    else:
-        combined_sim = np.zeros(len(BookDetails_df)) #makes sure there is no division of zero
+        queries.append((tfidf_index, new_tfidf_vector))
+
+    if queries:
+        return search_content(queries, top_n, nprobe)
+    rows = np.arange(min(top_n, BookDetails.num_rows)) #nothing to compare against
+    return rows, np.zeros(len(rows), dtype=np.float32)
+
+
+def content_candidates(title=None, description=None, genres=None, author=None, top_n=5, nprobe=CONTENT_INDEX_NPROBE):
+    "This method returns the content-based candidates (work_id, similarity); rows with no known work are skipped."
+    BookDetails = load_matricies()[3]
+    rows, scores = search_catalogue(title, description, genres, author, top_n, nprobe)
+    work_ids = BookDetails.column("work_id").take(pa.array(rows, type=pa.int64())).to_numpy(zero_copy_only=False)
+    known = work_ids != NO_WORK_ID
+    return Candidates.from_source(work_ids[known], scores[known], SOURCE_CONTENT)
+
+
+@lru_cache(maxsize=1)
+def _work_rows():
+    "work_id -> first catalogue row with that id."
+    work_ids = load_matricies()[3].column("work_id").to_numpy(zero_copy_only=False)
+    unique_ids, first = np.unique(work_ids, return_index=True)
+    return dict(zip(unique_ids.tolist(), first.tolist()))
+
+
+def work_vectors(work_ids):
+    "This method returns the (unit) title/description embedding of each work, a zero row for works not in the catalogue."
+    embeddings = load_matricies()[0]
+    rows_by_id = _work_rows()
+    rows = np.array([rows_by_id.get(int(wid), -1) for wid in work_ids], dtype=np.int64)
+    vectors = np.zeros((len(rows), embeddings.shape[1]), dtype=np.float32)
+    known = (rows >= 0) & (np.asarray(work_ids, dtype=np.uint64) != NO_WORK_ID)
+    vectors[known] = embeddings[rows[known]]
+    return vectors
+
+
+def reset_content_caches():
+    "Drops the loaded matrices and indexes, so the next query reads CONTENT_ARTIFACT_DIR again."
+    for cached in (_load_outcome, load_content_indexes, load_text_index, _work_rows):
+        cached.cache_clear()
+
+
+def recommend_content(title=None, description=None, genres=None, author=None, top_n=5, nprobe=CONTENT_INDEX_NPROBE):
+    "This method returns suggested books based off of a given title, description, genre, or author."
+    BookDetails = load_matricies()[3]
+    top_indices, scores = search_catalogue(title, description, genres, author, top_n, nprobe)
     
-    top_indices = combined_sim.argsort()[::-1][:top_n]
-    return BookDetails_df.iloc[top_indices][['title', 'author', 'genres', 'description']]
+    #only the picked rows are copied out of the mapped arrow file
+    return BookDetails.take(top_indices).select(['work_id', 'title', 'author', 'genres', 'description']).to_pandas()
 
 
 if __name__ == "__main__":
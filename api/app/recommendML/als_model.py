@@ -0,0 +1,201 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+## Matrix Factorization (Alternating Least Squares)
+#
+# Factorizes the sparse user-item ratings of the CF model into float32 user and work factors. Each half
+# step solves one small (factors x factors) system per user (or work); a block of rows is solved with one
+# batched np.linalg.solve, and blocks run on a thread pool since BLAS/LAPACK release the GIL.
+# Serving is a dot product with the work factors plus a top-k, and users the model has never seen are
+# folded in from their ratings with the same least squares step, without retraining.
+
+import os
+import numpy as np
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from .cf_model import RATINGS_FILE, load_cf_model
+from .candidates import Candidates, SOURCE_CF
+from .vector_index import top_k
+
+BASE_DIR = Path(__file__).resolve().parent
+
+#bump whenever the layout of the saved arrays changes, old files are then rebuilt
+ALS_MODEL_VERSION = 1
+ALS_MODEL_PATH = BASE_DIR / f"als_model_v{ALS_MODEL_VERSION}.npz"
+
+
+class ALSModel:
+    "User and work factors (float32) with the id <-> row maps of the CF model they were trained from."
+
+    def __init__(self, user_ids, work_ids, user_factors, item_factors, regularization, implicit, alpha, source_hash=""):
+        self.user_ids = user_ids #row -> user_id
+        self.work_ids = work_ids #row -> work_id
+        self.user_factors = user_factors #(users x factors)
+        self.item_factors = item_factors #(works x factors)
+        self.regularization = regularization
+        self.implicit = implicit
+        self.alpha = alpha
+        self.source_hash = source_hash
+        self.user_index = {int(uid): row for row, uid in enumerate(user_ids)}
+        self.work_index = {int(wid): row for row, wid in enumerate(work_ids)}
+
+    def user_row(self, user_id):
+        try:
+            return self.user_index.get(int(user_id))
+        except (TypeError, ValueError):
+            return None
+
+
+def _solve_block(indptr, indices, data, fixed, gram, regularization, implicit, alpha):
+    "Solves the least squares step for every row of one CSR block against the fixed side's factors."
+    n_rows, n_factors = len(indptr) - 1, fixed.shape[1]
+    eye = np.eye(n_factors, dtype=np.float32)
+    A = np.empty((n_rows, n_factors, n_factors), dtype=np.float32)
+    b = np.zeros((n_rows, n_factors), dtype=np.float32)
+
+    for row in range(n_rows):
+        lo, hi = indptr[row], indptr[row + 1]
+        vectors, values = fixed[indices[lo:hi]], data[lo:hi]
+        if implicit:
+            #Hu, Koren & Volinsky: confidence 1 + alpha * r on observed entries, preference 1
+            confidence = 1 + alpha * values
+            A[row] = gram + (vectors.T * (confidence - 1)) @ vectors + regularization * eye
+            b[row] = confidence @ vectors
+        else:
+            A[row] = vectors.T @ vectors + regularization * max(hi - lo, 1) * eye
+            b[row] = values @ vectors
+
+    return np.linalg.solve(A, b[..., None])[..., 0].astype(np.float32) #one batched LAPACK call per block
+
+
+def _solve_side(matrix, fixed, regularization, implicit, alpha, pool, block_size):
+    gram = (fixed.T @ fixed).astype(np.float32) if implicit else None
+    blocks = range(0, matrix.shape[0], block_size)
+
+    def solve(start):
+        stop = min(start + block_size, matrix.shape[0])
+        lo, hi = matrix.indptr[start], matrix.indptr[stop]
+        return _solve_block(
+            matrix.indptr[start:stop + 1] - lo, matrix.indices[lo:hi], matrix.data[lo:hi],
+            fixed, gram, regularization, implicit, alpha,
+        )
+
+    return np.vstack(list(pool.map(solve, blocks)))
+
+
+def train_als(user_item, factors=32, regularization=0.1, iterations=10, implicit=True, alpha=10.0,
+              workers=None, block_size=512, seed=0):
+    "When given a sparse (users x works) rating matrix, this method returns float32 (user_factors, item_factors)."
+    user_item = user_item.tocsr().astype(np.float32)
+    item_user = user_item.T.tocsr()
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((user_item.shape[0], factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((user_item.shape[1], factors)) * 0.01).astype(np.float32)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for _ in range(iterations):
+            user_factors = _solve_side(user_item, item_factors, regularization, implicit, alpha, pool, block_size)
+            item_factors = _solve_side(item_user, user_factors, regularization, implicit, alpha, pool, block_size)
+    return user_factors, item_factors
+
+
+def build_als_model(cf_model, **kwargs):
+    "Trains ALS on the CF model's rating matrix, so both models share user and work ids."
+    regularization = kwargs.setdefault("regularization", 0.1)
+    implicit = kwargs.setdefault("implicit", True)
+    alpha = kwargs.setdefault("alpha", 10.0)
+    user_factors, item_factors = train_als(cf_model.user_item, **kwargs)
+    return ALSModel(cf_model.user_ids, cf_model.work_ids, user_factors, item_factors,
+                    regularization, implicit, alpha, cf_model.source_hash)
+
+
+def fold_in(model, work_ids, ratings):
+    "Returns the factor vector of a user the model was not trained on, from (work_id, rating) pairs; None when no work is known."
+    cols, values = [], []
+    for wid, rating in zip(work_ids, ratings):
+        col = model.work_index.get(int(wid))
+        if col is not None and rating > 0:
+            cols.append(col)
+            values.append(rating)
+    if not cols:
+        return None
+
+    fixed = model.item_factors
+    gram = (fixed.T @ fixed).astype(np.float32) if model.implicit else None
+    return _solve_block(
+        np.array([0, len(cols)]), np.array(cols), np.array(values, dtype=np.float32),
+        fixed, gram, model.regularization, model.implicit, model.alpha,
+    )[0]
+
+
+def recommend_als(model, user_vector, top_n=5, exclude_works=()):
+    "Top-n works by predicted score for a user factor vector, skipping the given work_ids."
+    scores = model.item_factors @ user_vector
+    for wid in exclude_works:
+        col = model.work_index.get(int(wid))
+        if col is not None:
+            scores[col] = -np.inf
+
+    candidates = np.flatnonzero(np.isfinite(scores))
+    top_items = candidates[top_k(scores[candidates], top_n)]
+    return Candidates.from_source(model.work_ids[top_items], scores[top_items], SOURCE_CF)
+
+
+def save_als_model(model, path=ALS_MODEL_PATH):
+    np.savez(
+        path,
+        version=np.array(ALS_MODEL_VERSION),
+        source_hash=np.array(model.source_hash),
+        user_ids=model.user_ids,
+        work_ids=model.work_ids,
+        user_factors=model.user_factors,
+        item_factors=model.item_factors,
+        regularization=np.array(model.regularization),
+        implicit=np.array(model.implicit),
+        alpha=np.array(model.alpha),
+    )
+
+
+def read_als_model(path=ALS_MODEL_PATH):
+    "Reads saved factors, returning None when the file was written by a different model version."
+    with np.load(path) as files:
+        if int(files["version"]) != ALS_MODEL_VERSION:
+            return None
+        return ALSModel(
+            files["user_ids"],
+            files["work_ids"],
+            files["user_factors"],
+            files["item_factors"],
+            float(files["regularization"]),
+            bool(files["implicit"]),
+            float(files["alpha"]),
+            str(files["source_hash"]),
+        )
+
+
+@lru_cache(maxsize=1)
+def load_als_model(path=ALS_MODEL_PATH):
+    "Loads the factors once per process, retraining them when they are missing or older than the CF model's ratings."
+    cf_model = load_cf_model()
+    path = Path(path)
+
+    if path.exists():
+        model = read_als_model(path)
+        if model is not None and model.source_hash == cf_model.source_hash:
+            return model
+
+    print(f"[als_model] training {path.name} from {RATINGS_FILE}")
+    model = build_als_model(cf_model)
+    try:
+        save_als_model(model, path)
+    except OSError as e:
+        print("[als_model] could not save model:", repr(e))
+    return model
+
+
+if __name__ == "__main__":
+    ## run offline (python -m app.recommendML.als_model) whenever the ratings change
+    model = build_als_model(load_cf_model())
+    save_als_model(model)
+    print(f"Saved {ALS_MODEL_PATH.name}: {model.user_factors.shape[0]} users, "
+          f"{model.item_factors.shape[0]} works, {model.user_factors.shape[1]} factors")
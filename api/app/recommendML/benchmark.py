@@ -0,0 +1,297 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Offline evaluation and latency benchmark
+#
+# Quality: ratings_5k.csv is split by rated_at (older ratings train, newer ones test). Every engine is
+# trained on the older part and scored on precision/recall/NDCG@k against each test user's well rated
+# works, plus catalogue coverage.
+# Speed: at each synthetic scale the models are built and every engine is timed per call (p50/p95/p99),
+# with the peak traced memory of the build and of serving. The content engine and the blended combinedRS
+# run against content artifacts built for the synthetic catalogue in a temporary directory.
+# Everything goes to one JSON report, so runs can be compared before a deploy:
+#   python -m app.recommendML.benchmark --scales 10000 100000 1000000 --out benchmark_report.json
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from . import BERT_TFIDF_Content as content
+from .BERT_TFIDF_Content import content_candidates, get_TFIDF_Vector, getCSVdf, load_matricies
+from .content_artifacts import save_content_artifacts
+from .embedding_service import get_embedding_service
+from .cf_model import RATINGS_FILE, WORKS_FILE, build_cf_model
+from .als_model import build_als_model, recommend_als
+from .collaborative_testing import recommend_for_user, recommend_items_for_user
+from .hybrid_ranker import popular_candidates
+from .weightedcombov2 import combinedRS
+from ..syntheticData import book_details, generate_catalogue, generate_ratings
+
+BASE_DIR = Path(__file__).resolve().parent
+REPORT_PATH = BASE_DIR / "benchmark_report.json"
+RELEVANT_RATING = 7 #ratings are 0-10; a test rating at or above this counts as a hit
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+HYBRID_WEIGHTS = ((1.0, 0.0), (0.7, 0.3), (0.4, 0.6))
+
+
+def time_split(ratings, test_fraction=0.2):
+    "Splits ratings at the rated_at quantile; test rows of users or works unseen in training are dropped."
+    ratings = ratings.assign(rated_at=pd.to_datetime(ratings["rated_at"]))
+    cutoff = ratings["rated_at"].quantile(1 - test_fraction)
+    train = ratings[ratings["rated_at"] < cutoff]
+    test = ratings[ratings["rated_at"] >= cutoff]
+    test = test[test["user_id"].isin(train["user_id"]) & test["work_id"].isin(train["work_id"])]
+    return train, test, cutoff
+
+
+def ranking_metrics(recommended, relevant, k):
+    "precision@k, recall@k and binary NDCG@k of one ranked list."
+    recommended = list(recommended)[:k]
+    hits = np.array([wid in relevant for wid in recommended], dtype=np.float64)
+    if not relevant:
+        return 0.0, 0.0, 0.0
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float((hits * discounts[:len(hits)]).sum())
+    ideal = float(discounts[:min(len(relevant), k)].sum())
+    return hits.sum() / k, hits.sum() / len(relevant), dcg / ideal
+
+
+def evaluate(recommend, relevant_by_user, k, catalogue_size):
+    "Averages the ranking metrics of recommend(user_id, k) -> Candidates over the test users."
+    precision, recall, ndcg = [], [], []
+    recommended_works = set()
+    for user_id, relevant in relevant_by_user.items():
+        ids = recommend(user_id, k).ids()
+        recommended_works.update(ids)
+        p, r, n = ranking_metrics(ids, relevant, k)
+        precision.append(p)
+        recall.append(r)
+        ndcg.append(n)
+    return {
+        f"precision@{k}": float(np.mean(precision)) if precision else 0.0,
+        f"recall@{k}": float(np.mean(recall)) if recall else 0.0,
+        f"ndcg@{k}": float(np.mean(ndcg)) if ndcg else 0.0,
+        "coverage": len(recommended_works) / catalogue_size if catalogue_size else 0.0,
+        "users": len(relevant_by_user),
+    }
+
+
+def content_available():
+    try:
+        load_matricies()
+        return True, None
+    except Exception as e:
+        return False, repr(e)
+
+
+def latest_titles(cf_model, ratings):
+    "user_id -> title of the work they rated last (by rated_at) among the ratings the CF model was built from."
+    rated = ratings[ratings["rating_value"] > 0] #the model drops 0 ratings, so their works may have no column
+    latest = rated.assign(rated_at=pd.to_datetime(rated["rated_at"])).sort_values("rated_at", kind="stable")
+    latest = latest.drop_duplicates("user_id", keep="last")
+    titles = {}
+    for user_id, work_id in zip(latest["user_id"], latest["work_id"]):
+        col = cf_model.work_index.get(int(work_id))
+        if col is not None:
+            titles[int(user_id)] = str(cf_model.work_titles[col])
+    return titles
+
+
+def build_engines(cf_model, als_iterations=10, with_content=False, ratings=None):
+    "name -> recommend(user_id, top_n) for every engine and weight setting under test; the content engines need the training ratings."
+    als_model = build_als_model(cf_model, iterations=als_iterations)
+    user_item = cf_model.user_item
+
+    def rated_works(row):
+        return cf_model.work_ids[user_item.indices[user_item.indptr[row]:user_item.indptr[row + 1]]]
+
+    def als(user_id, top_n):
+        row = als_model.user_row(user_id)
+        if row is None:
+            return popular_candidates(cf_model, top_n)
+        return recommend_als(als_model, als_model.user_factors[row], top_n, exclude_works=rated_works(row))
+
+    engines = {
+        "cf_user": lambda user_id, top_n: recommend_for_user(user_id, cf_model, top_n),
+        "cf_item": lambda user_id, top_n: recommend_items_for_user(user_id, cf_model, top_n),
+        "als": als,
+        "popular": lambda user_id, top_n: popular_candidates(cf_model, top_n, exclude_row=cf_model.user_row(user_id)),
+    }
+
+    if with_content:
+        #the user's most recently rated title stands in for the browse page's query
+        titles = latest_titles(cf_model, ratings)
+
+        def last_title(user_id):
+            return titles.get(int(user_id))
+
+        #the catalogue search behind recommend_content, returning the ids it ranks
+        engines["content"] = lambda user_id, top_n: content_candidates(title=last_title(user_id), top_n=top_n)
+        for weight_cf, weight_cb in HYBRID_WEIGHTS:
+            engines[f"hybrid_cf{weight_cf}_cb{weight_cb}"] = (
+                lambda user_id, top_n, w_cf=weight_cf, w_cb=weight_cb: combinedRS(
+                    user_id, cf_model, title=last_title(user_id), weight_cf=w_cf, weight_cb=w_cb, top_n=top_n
+                )
+            )
+    return engines, als_model
+
+
+def run_quality(k=10, test_fraction=0.2, als_iterations=10):
+    ratings = getCSVdf(RATINGS_FILE)
+    works = getCSVdf(WORKS_FILE)
+    train, test, cutoff = time_split(ratings, test_fraction)
+
+    relevant = test[test["rating_value"] >= RELEVANT_RATING].groupby("user_id")["work_id"]
+    relevant_by_user = {int(uid): set(int(w) for w in wids) for uid, wids in relevant}
+
+    cf_model = build_cf_model(train, works)
+    with_content, content_error = content_available()
+    engines, _ = build_engines(cf_model, als_iterations, with_content, ratings=train)
+
+    results = {name: evaluate(fn, relevant_by_user, k, cf_model.user_item.shape[1]) for name, fn in engines.items()}
+    return {
+        "k": k,
+        "relevant_rating": RELEVANT_RATING,
+        "cutoff": str(cutoff),
+        "train_ratings": len(train),
+        "test_ratings": len(test),
+        "content_engine": "available" if with_content else f"skipped: {content_error}",
+        "engines": results,
+    }
+
+
+def synthetic_ratings(n_ratings, seed=0, zipf=1.1):
+    "Ratings with power-law work popularity and user activity, shaped like ratings_5k.csv (see app/syntheticData.py), with the works and their content-engine details."
+    rng = np.random.default_rng(seed)
+    n_users = max(n_ratings // 40, 100)
+    n_works = max(n_ratings // 50, 1000)
+    catalogue = generate_catalogue(n_works, rng)
+    works = catalogue["works"]
+    users = pd.DataFrame({"user_id": np.arange(1, n_users + 1)})
+    ratings = generate_ratings(users, works, n_ratings / n_users, rng, zipf)
+    #the generator writes work ids as decimal strings; read back from a csv they are uint64, like works.csv
+    work_ids = works["work_id"].to_numpy(dtype=np.uint64)
+    details = book_details(catalogue).assign(work_id=work_ids) #one row per work, in works order
+    works = pd.DataFrame({"work_id": work_ids, "title": works["title"]})
+    return ratings.astype({"work_id": np.uint64}), works, details
+
+
+@contextmanager
+def synthetic_content(details, artifact_dir):
+    "Builds content artifacts for a synthetic catalogue and serves the content engine from them until the block exits."
+    encoder = get_embedding_service().encoder #the query encoder, so queries and catalogue share a space
+    texts = (details["title"] + " " + details["description"]).tolist()
+    embeddings = np.vstack([encoder.encode(texts[i:i + 4096]) for i in range(0, len(texts), 4096)])
+    vectorizer, vector_Matrix = get_TFIDF_Vector((details["genres"] + " " + details["author"]).tolist())
+    save_content_artifacts(embeddings, vector_Matrix, vectorizer, details, artifact_dir)
+
+    previous = content.CONTENT_ARTIFACT_DIR
+    content.CONTENT_ARTIFACT_DIR = Path(artifact_dir)
+    content.reset_content_caches()
+    try:
+        yield
+    finally:
+        content.CONTENT_ARTIFACT_DIR = previous
+        content.reset_content_caches()
+
+
+def latency_percentiles(fn, user_ids, top_n):
+    timings = np.empty(len(user_ids))
+    for i, user_id in enumerate(user_ids):
+        start = time.perf_counter()
+        fn(user_id, top_n)
+        timings[i] = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(timings * 1000, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "calls": len(user_ids)}
+
+
+def traced_peak(fn, *args, **kwargs):
+    "Runs fn and returns (result, peak traced bytes allocated during the call)."
+    tracemalloc.start()
+    try:
+        result = fn(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def run_scale(n_ratings, top_n=10, calls=200, als_iterations=5, seed=0):
+    ratings, works, details = synthetic_ratings(n_ratings, seed)
+
+    start = time.perf_counter()
+    cf_model, cf_peak = traced_peak(build_cf_model, ratings, works)
+    cf_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(cf_model.user_ids, size=min(calls, len(cf_model.user_ids)), replace=False)
+    serving = {}
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        start = time.perf_counter()
+        with synthetic_content(details, artifact_dir):
+            content_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            (engines, _), als_peak = traced_peak(build_engines, cf_model, als_iterations, with_content=True, ratings=ratings)
+            als_seconds = time.perf_counter() - start
+
+            #builds the content indexes and fills the embedding service's query cache, so every engine
+            #reading the content side is timed on the search and the blend, not on first-use setup
+            for uid in user_ids:
+                engines["content"](uid, top_n)
+            for name, fn in engines.items():
+                serving[name] = latency_percentiles(fn, user_ids, top_n)
+                _, serving[name]["peak_bytes"] = traced_peak(lambda: [fn(uid, top_n) for uid in user_ids[:20]])
+
+    return {
+        "ratings": len(ratings), #after dropping repeated (user, work) draws
+        "users": int(cf_model.user_item.shape[0]),
+        "works": int(cf_model.user_item.shape[1]),
+        "build": {
+            "cf_seconds": cf_seconds,
+            "cf_peak_bytes": cf_peak,
+            "als_seconds": als_seconds,
+            "als_peak_bytes": als_peak,
+            "content_seconds": content_seconds,
+        },
+        "engines": serving,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommender quality and latency benchmark")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--scales", type=int, nargs="*", default=list(DEFAULT_SCALES))
+    parser.add_argument("--calls", type=int, default=200, help="timed calls per engine and scale")
+    parser.add_argument("--als-iterations", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "quality": run_quality(args.k, als_iterations=args.als_iterations),
+        "scales": [],
+    }
+    for n_ratings in args.scales:
+        print(f"[benchmark] {n_ratings} synthetic ratings")
+        report["scales"].append(run_scale(n_ratings, args.k, args.calls, args.als_iterations))
+
+    args.out.write_text(json.dumps(report, indent=2))
+    print(f"[benchmark] report written to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
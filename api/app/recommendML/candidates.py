@@ -0,0 +1,73 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Recommendation candidates as parallel numpy arrays: work_ids (uint64), scores (float32), sources (uint8)
+
+import numpy as np
+
+#sources are bit flags, so a work suggested by several engines carries all of them
+SOURCE_CF = 1
+SOURCE_CONTENT = 2
+SOURCE_POPULAR = 4
+SOURCE_NAMES = {SOURCE_CF: "cf", SOURCE_CONTENT: "content", SOURCE_POPULAR: "popular"}
+
+
+def source_name(flags):
+    return "+".join(name for flag, name in SOURCE_NAMES.items() if flags & flag) or str(flags)
+
+
+class Candidates:
+    "Ranked (work_id, score, source) triples. Order is the ranking; every operation returns a new object."
+    __slots__ = ("work_ids", "scores", "sources")
+
+    def __init__(self, work_ids, scores, sources):
+        self.work_ids = np.asarray(work_ids, dtype=np.uint64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.sources = np.asarray(sources, dtype=np.uint8)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.uint8))
+
+    @classmethod
+    def from_source(cls, work_ids, scores, source):
+        "Candidates that all came from one engine."
+        work_ids = np.asarray(work_ids, dtype=np.uint64)
+        return cls(work_ids, scores, np.full(len(work_ids), source, dtype=np.uint8))
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.work_ids for p in parts]),
+            np.concatenate([p.scores for p in parts]),
+            np.concatenate([p.sources for p in parts]),
+        )
+
+    def __len__(self):
+        return len(self.work_ids)
+
+    def take(self, positions):
+        return Candidates(self.work_ids[positions], self.scores[positions], self.sources[positions])
+
+    def head(self, n):
+        return self.take(slice(0, max(n, 0)))
+
+    def unique(self):
+        "Drops repeated work_ids, keeping the first (best ranked) occurrence."
+        _, first = np.unique(self.work_ids, return_index=True)
+        return self.take(np.sort(first))
+
+    def ids(self):
+        "The work_ids as Python ints, in rank order."
+        return [int(wid) for wid in self.work_ids]
+
+    def to_list(self):
+        return [
+            (int(wid), float(score), source_name(int(source)))
+            for wid, score, source in zip(self.work_ids, self.scores, self.sources)
+        ]
+
+    def __repr__(self):
+        return f"Candidates({self.to_list()!r})"
@@ -0,0 +1,178 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+## Precomputed Collaborative Filtering Model
+
+import hashlib
+import numpy as np
+from scipy import sparse
+from pathlib import Path
+from functools import lru_cache
+from .BERT_TFIDF_Content import getCSVdf
+from .hybrid_ranker import popularity_ranking
+
+BASE_DIR = Path(__file__).resolve().parent
+
+#bump whenever the layout of the saved arrays changes, old files are then rebuilt
+CF_MODEL_VERSION = 3
+CF_MODEL_PATH = BASE_DIR / f"cf_model_v{CF_MODEL_VERSION}.npz"
+RATINGS_FILE = "ratings_5k.csv"
+WORKS_FILE = "works.csv"
+
+
+class CFModel:
+    "Sparse user-item ratings, the id <-> row/column maps, the precomputed nearest neighbours of each user and of each work, and the popularity ranking."
+
+    def __init__(self, user_ids, work_ids, work_titles, user_item, neighbor_idx, neighbor_sim,
+                 item_neighbor_idx, item_neighbor_sim, source_hash=""):
+        self.user_ids = user_ids #row -> user_id
+        self.work_ids = work_ids #column -> work_id
+        self.work_titles = work_titles #column -> title
+        self.user_item = user_item #csr (users x works)
+        self.neighbor_idx = neighbor_idx #(users x k) neighbour rows, -1 padded
+        self.neighbor_sim = neighbor_sim #(users x k) cosine similarity of each neighbour
+        self.item_neighbor_idx = item_neighbor_idx #(works x k) neighbour columns, -1 padded
+        self.item_neighbor_sim = item_neighbor_sim #(works x k)
+        self.source_hash = source_hash
+        self.user_index = {int(uid): row for row, uid in enumerate(user_ids)}
+        self.work_index = {int(wid): col for col, wid in enumerate(work_ids)}
+        self.popular_cols, self.popular_scores = popularity_ranking(user_item) #cold-start list, best first
+
+    def user_row(self, user_id):
+        "Returns the matrix row of a user, or None when the user has no ratings."
+        try:
+            return self.user_index.get(int(user_id)) #the api passes user ids around as strings
+        except (TypeError, ValueError):
+            return None
+
+
+def _source_hash(filenames=(RATINGS_FILE, WORKS_FILE)):
+    "Hashes the source csvs so a model built from older ratings or titles is detected as stale."
+    digest = hashlib.sha256()
+    for filename in filenames:
+        digest.update((BASE_DIR / filename).read_bytes())
+    return digest.hexdigest()
+
+
+def _top_k_neighbors(user_item, k, chunk_size=1024):
+    "Computes each row's top-k cosine neighbours, a block of rows at a time so memory stays bounded."
+    n_users = user_item.shape[0]
+    k = min(k, max(n_users - 1, 0))
+    neighbor_idx = np.full((n_users, k), -1, dtype=np.int32)
+    neighbor_sim = np.zeros((n_users, k), dtype=np.float32)
+    if k == 0:
+        return neighbor_idx, neighbor_sim
+
+    norms = np.sqrt(np.asarray(user_item.multiply(user_item).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.diags(1.0 / norms).dot(user_item).tocsr()
+    normalized_t = normalized.T.tocsr()
+
+    for start in range(0, n_users, chunk_size):
+        stop = min(start + chunk_size, n_users)
+        block = normalized[start:stop].dot(normalized_t).toarray()
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf #a row is not its own neighbour
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_sim = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_sim, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_sim = np.take_along_axis(top_sim, order, axis=1)
+
+        keep = top_sim > 0 #zero similarity neighbours never contribute to a score
+        neighbor_idx[start:stop] = np.where(keep, top, -1)
+        neighbor_sim[start:stop] = np.where(keep, top_sim, 0)
+    return neighbor_idx, neighbor_sim
+
+
+def build_cf_model(ratings_df, works_df, n_neighbors=50, n_item_neighbors=50, source_hash=""):
+    "When given the ratings and works dataframes, this method builds the sparse user-item matrix, the title index and the user and work neighbour lists."
+    ratings = ratings_df[["user_id", "work_id", "rating_value"]]
+    ratings = ratings[ratings["rating_value"] > 0] #a 0 was an empty cell in the old pivot table
+    ratings = ratings.groupby(["user_id", "work_id"], as_index=False)["rating_value"].mean()
+
+    user_ids, user_rows = np.unique(ratings["user_id"].to_numpy(dtype=np.int64), return_inverse=True)
+    work_ids, work_cols = np.unique(ratings["work_id"].to_numpy(dtype=np.uint64), return_inverse=True)
+    user_item = sparse.csr_matrix(
+        (ratings["rating_value"].to_numpy(dtype=np.float32), (user_rows, work_cols)),
+        shape=(len(user_ids), len(work_ids)),
+    )
+
+    #titles line up with the matrix columns so a result column maps straight to its title
+    titles_by_id = works_df.drop_duplicates("work_id").set_index("work_id")["title"]
+    work_titles = titles_by_id.reindex(work_ids).fillna("").to_numpy(dtype=str)
+
+    neighbor_idx, neighbor_sim = _top_k_neighbors(user_item, n_neighbors)
+    #works x k table for item-based CF: its size grows with the catalogue, never with the number of users
+    item_neighbor_idx, item_neighbor_sim = _top_k_neighbors(user_item.T.tocsr(), n_item_neighbors)
+    return CFModel(user_ids, work_ids, work_titles, user_item, neighbor_idx, neighbor_sim,
+                   item_neighbor_idx, item_neighbor_sim, source_hash)
+
+
+def save_cf_model(model, path=CF_MODEL_PATH):
+    "This method saves the model's arrays into a single versioned .npz file."
+    np.savez(
+        path,
+        version=np.array(CF_MODEL_VERSION),
+        source_hash=np.array(model.source_hash),
+        user_ids=model.user_ids,
+        work_ids=model.work_ids,
+        work_titles=model.work_titles,
+        data=model.user_item.data,
+        indices=model.user_item.indices,
+        indptr=model.user_item.indptr,
+        shape=np.array(model.user_item.shape),
+        neighbor_idx=model.neighbor_idx,
+        neighbor_sim=model.neighbor_sim,
+        item_neighbor_idx=model.item_neighbor_idx,
+        item_neighbor_sim=model.item_neighbor_sim,
+    )
+
+
+def read_cf_model(path=CF_MODEL_PATH):
+    "Reads a saved model, returning None when the file was written by a different model version."
+    with np.load(path) as files:
+        if int(files["version"]) != CF_MODEL_VERSION:
+            return None
+        user_item = sparse.csr_matrix(
+            (files["data"], files["indices"], files["indptr"]),
+            shape=tuple(files["shape"]),
+        )
+        return CFModel(
+            files["user_ids"],
+            files["work_ids"],
+            files["work_titles"],
+            user_item,
+            files["neighbor_idx"],
+            files["neighbor_sim"],
+            files["item_neighbor_idx"],
+            files["item_neighbor_sim"],
+            str(files["source_hash"]),
+        )
+
+
+@lru_cache(maxsize=1)
+def load_cf_model(path=CF_MODEL_PATH):
+    "Loads the collaborative filtering model once per process, rebuilding it if it is missing or stale."
+    source_hash = _source_hash()
+    path = Path(path)
+
+    if path.exists():
+        model = read_cf_model(path)
+        if model is not None and model.source_hash == source_hash:
+            return model
+
+    print(f"[cf_model] building {path.name} from {RATINGS_FILE}")
+    model = build_cf_model(getCSVdf(RATINGS_FILE), getCSVdf(WORKS_FILE), source_hash=source_hash)
+    try:
+        save_cf_model(model, path)
+    except OSError as e:
+        print("[cf_model] could not save model:", repr(e)) #read-only deploys still serve from memory
+    return model
+
+
+if __name__ == "__main__":
+    ## run offline (python -m app.recommendML.cf_model) whenever the ratings change
+    model = build_cf_model(getCSVdf(RATINGS_FILE), getCSVdf(WORKS_FILE), source_hash=_source_hash())
+    save_cf_model(model)
+    print(f"Saved {CF_MODEL_PATH.name}: {model.user_item.shape[0]} users, "
+          f"{model.user_item.shape[1]} works, {model.user_item.nnz} ratings")
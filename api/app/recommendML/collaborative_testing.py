@@ -3,10 +3,11 @@
 ## Collaborative Filtering Testing and Development
 
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from functools import lru_cache
+import numpy as np
+from .candidates import Candidates, SOURCE_CF
+from .als_model import fold_in, load_als_model, recommend_als
+from .vector_index import top_k
 # from sklearn.feature_extraction.text import TfidfVectorizer
-# import numpy as np  
 # import pickle
 
 
@@ -15,54 +16,88 @@ def getCSVdf  (filename, encoding_type = "utf-8"):
     book_dataframe = pd.read_csv(filename, encoding = encoding_type)
     return book_dataframe
 
-# based on ratings!
-@lru_cache(maxsize=1)
-def getuser_item_matrix(fulldf):
-    "When given the fully merged dataframe, it will return the user item matrix, the similarity matrix, and the user dataframe."
-    user_item_matrix = fulldf.pivot_table(index="user_id",columns="work_id",values="rating_value").fillna(0) #user-item relationship 
-    user_similarity = cosine_similarity(user_item_matrix)
-    user_df = pd.DataFrame(user_similarity,index=user_item_matrix.index,columns=user_item_matrix.index)
-
-    return user_item_matrix, user_similarity, user_df
-
-
-def recommend_for_user(user_id, user_similarity_df, user_item_matrix, works, top_n=5):
-    "This method when given the user's id, the user similarity dataframe, user item matrix, and the "
-    if user_id not in user_similarity_df.index:
-        return [] #no recommendations for new users; otherwise raise errors
-    
-    similar_users = user_similarity_df[user_id].sort_values(ascending=False).drop(user_id)
-    user_rated = set(user_item_matrix.loc[user_id][user_item_matrix.loc[user_id] > 0].index)
-    
-    scores = {}
-    for sim_user, sim_score in similar_users.items():
-        for work_id, rating in user_item_matrix.loc[sim_user].items():
-            if work_id not in user_rated and rating > 0:
-                scores[work_id] = scores.get(work_id, 0) + sim_score * rating
-    
-
-    top_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-    recommendations = []
-    for wid, score in top_items:
-        title = works.loc[works["work_id"] == wid, "title"].values[0]
-        recommendations.append((wid, title, score))
-    return recommendations
+
+def _top_scores(cf_model, scores, top_n):
+    "Top-n works by score (positive scores only) as CF candidates."
+    candidates = np.flatnonzero(scores > 0)
+    top_items = candidates[top_k(scores[candidates], top_n)]
+    return Candidates.from_source(cf_model.work_ids[top_items], scores[top_items], SOURCE_CF)
+
+
+def recommend_for_user(user_id, cf_model, top_n=5):
+    "This method when given the user's id and the precomputed CF model returns the top user-based CF candidates (work_id, score)."
+    row = cf_model.user_row(user_id)
+    if row is None:
+        return Candidates.empty() #no recommendations for new users; otherwise raise errors
+
+    neighbors = cf_model.neighbor_idx[row]
+    keep = neighbors >= 0 #neighbour lists are padded with -1
+    neighbors, sims = neighbors[keep], cf_model.neighbor_sim[row][keep]
+    if neighbors.size == 0:
+        return Candidates.empty()
+
+    #weighted score of every work in one sparse product: (k x works).T @ (k,)
+    user_item = cf_model.user_item
+    scores = np.asarray(user_item[neighbors].T.dot(sims)).ravel()
+    scores[user_item.indices[user_item.indptr[row]:user_item.indptr[row + 1]]] = 0 #skip already rated works
+    return _top_scores(cf_model, scores, top_n)
+
+
+def recommend_items_for_user(user_id, cf_model, top_n=5):
+    "This method returns the top item-based CF candidates: neighbours of the works the user rated, weighted by similarity and rating."
+    row = cf_model.user_row(user_id)
+    if row is None:
+        return Candidates.empty()
+
+    user_item = cf_model.user_item
+    start, stop = user_item.indptr[row], user_item.indptr[row + 1]
+    rated, ratings = user_item.indices[start:stop], user_item.data[start:stop]
+
+    #(history x k) lookups into the neighbour table, so the cost follows the user's history length
+    neighbors = cf_model.item_neighbor_idx[rated]
+    weights = cf_model.item_neighbor_sim[rated] * ratings[:, None]
+    keep = neighbors >= 0
+    scores = np.bincount(neighbors[keep], weights=weights[keep], minlength=user_item.shape[1])
+    scores[rated] = 0
+    return _top_scores(cf_model, scores, top_n)
+
+
+def recommend_als_for_user(user_id, cf_model, top_n=5, recent=None):
+    "This method returns the top matrix-factorization candidates; a user ALS was not trained on is folded in from recent (work_ids, ratings) when given."
+    als_model = load_als_model()
+    row = als_model.user_row(user_id)
+    if row is not None:
+        user_vector = als_model.user_factors[row]
+    elif recent is not None:
+        user_vector = fold_in(als_model, *recent)
+    else:
+        user_vector = None
+    if user_vector is None:
+        return Candidates.empty()
+
+    if recent is not None:
+        rated = recent[0]
+    else:
+        cf_row = cf_model.user_row(user_id)
+        user_item = cf_model.user_item
+        rated = [] if cf_row is None else cf_model.work_ids[user_item.indices[user_item.indptr[cf_row]:user_item.indptr[cf_row + 1]]]
+    return recommend_als(als_model, user_vector, top_n, exclude_works=rated)
+
+
+CF_STRATEGIES = {"user": recommend_for_user, "item": recommend_items_for_user, "als": recommend_als_for_user}
 
 
 #example test
 if __name__ == "__main__":
+    from .cf_model import build_cf_model #run as python -m app.recommendML.collaborative_testing
+
     works = getCSVdf("works.csv")
     users = getCSVdf("users.csv")
     ratings_5k = getCSVdf("ratings_5k.csv")
+    cf_model = build_cf_model(ratings_5k, works)
 
-    ratings_5k = ratings_5k.drop(columns = ["rated_at"]) #time of rating does not matter
-    works = works.drop(columns = ["publish_year"]) #publish year also does not matter in recc.
-
-#merging the csvs togther into one df
-    ratings_works = ratings_5k.merge(works, on = "work_id", how = "left")
-    fulldf = ratings_works.merge(users, on = "user_id", how = "left")
-    user_item_matrix, user_similarity, user_df = getuser_item_matrix(fulldf)
-
-    user1 = fulldf["user_id"].iloc[0]  
+    user1 = ratings_5k["user_id"].iloc[0]  
     print(f"\nRecommendations for user {user1}:")
-    print(recommend_for_user(user1, user_df, user_item_matrix, works, top_n=5))
+    print(recommend_for_user(user1, cf_model, top_n=5).to_list())
+    print(recommend_items_for_user(user1, cf_model, top_n=5).to_list())
+    print(recommend_als_for_user(user1, cf_model, top_n=5).to_list())
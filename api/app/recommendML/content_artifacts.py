@@ -0,0 +1,160 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Memory-mapped storage for the content-based matrices
+#
+# Layout of an artifact directory:
+#   embeddings.npy                                  BERT embeddings, float32
+#   tfidf_data.npy, tfidf_indices.npy, tfidf_indptr.npy   CSR parts of the TF-IDF matrix
+#   book_details.arrow                              book metadata columns (Arrow IPC, uncompressed)
+#   tfidf_vectorizer.pkl                            fitted TfidfVectorizer
+#   manifest.json                                   shapes, dtypes and sha256 of every file
+# Both matrices are stored with L2 normalized float32 rows so the vector indexes can use them without a copy.
+# Every array is opened with mmap_mode="r", so uvicorn workers on one machine share the pages through the OS cache.
+
+import hashlib
+import json
+import pickle
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from pathlib import Path
+from datetime import datetime, timezone
+
+BASE_DIR = Path(__file__).resolve().parent
+ARTIFACT_DIR = BASE_DIR / "content_artifacts"
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class ArtifactError(Exception):
+    "Raised when an artifact directory is missing, incomplete, or does not match its manifest."
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_array(out_dir, name, array):
+    path = out_dir / f"{name}.npy"
+    np.save(path, np.ascontiguousarray(array))
+    return path
+
+
+def save_content_artifacts(embeddings, vector_Matrix, vectorizer, BookDetails_df, out_dir=ARTIFACT_DIR):
+    "This method writes the matrices, metadata and vectorizer into out_dir along with their manifest."
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    vector_Matrix = normalize(sparse.csr_matrix(vector_Matrix, dtype=np.float32))
+    embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+
+    paths = {
+        "embeddings": _save_array(out_dir, "embeddings", embeddings),
+        "tfidf_data": _save_array(out_dir, "tfidf_data", vector_Matrix.data),
+        "tfidf_indices": _save_array(out_dir, "tfidf_indices", vector_Matrix.indices),
+        "tfidf_indptr": _save_array(out_dir, "tfidf_indptr", vector_Matrix.indptr),
+    }
+
+    table = pa.Table.from_pandas(BookDetails_df.reset_index(drop=True), preserve_index=False)
+    paths["book_details"] = out_dir / "book_details.arrow"
+    with pa.OSFile(str(paths["book_details"]), "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    paths["tfidf_vectorizer"] = out_dir / "tfidf_vectorizer.pkl"
+    with open(paths["tfidf_vectorizer"], "wb") as f:
+        pickle.dump(vectorizer, f)
+
+    files = {}
+    for name, path in paths.items():
+        entry = {"path": path.name, "sha256": _sha256(path)}
+        if path.suffix == ".npy":
+            array = np.load(path, mmap_mode="r")
+            entry.update(shape=list(array.shape), dtype=str(array.dtype))
+        elif name == "book_details":
+            entry.update(shape=[table.num_rows, table.num_columns], columns=table.column_names)
+        files[name] = entry
+
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tfidf_shape": list(vector_Matrix.shape),
+        "normalized": True,
+        "content_hash": hashlib.sha256(
+            "".join(files[name]["sha256"] for name in sorted(files)).encode("utf-8")
+        ).hexdigest(),
+        "files": files,
+    }
+    with open(out_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(artifact_dir=ARTIFACT_DIR):
+    manifest_path = Path(artifact_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise ArtifactError(f"No manifest at {manifest_path}")
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format {manifest.get('format_version')}")
+    return manifest
+
+
+def _open_array(artifact_dir, entry):
+    array = np.load(Path(artifact_dir) / entry["path"], mmap_mode="r")
+    if list(array.shape) != entry["shape"] or str(array.dtype) != entry["dtype"]:
+        raise ArtifactError(f"{entry['path']} does not match the manifest")
+    return array
+
+
+def load_content_artifacts(artifact_dir=ARTIFACT_DIR, verify_hashes=False):
+    "This method memory-maps the saved artifacts, returning (embeddings, tfidf matrix, vectorizer, metadata table, manifest)."
+    artifact_dir = Path(artifact_dir)
+    manifest = read_manifest(artifact_dir)
+    files = manifest["files"]
+
+    if verify_hashes: #reads every byte, so leave it to offline checks rather than worker start up
+        for name, entry in files.items():
+            if _sha256(artifact_dir / entry["path"]) != entry["sha256"]:
+                raise ArtifactError(f"{entry['path']} failed its sha256 check")
+
+    embeddings = _open_array(artifact_dir, files["embeddings"])
+    vector_Matrix = sparse.csr_matrix(
+        (
+            _open_array(artifact_dir, files["tfidf_data"]),
+            _open_array(artifact_dir, files["tfidf_indices"]),
+            _open_array(artifact_dir, files["tfidf_indptr"]),
+        ),
+        shape=tuple(manifest["tfidf_shape"]),
+        copy=False,
+    )
+
+    source = pa.memory_map(str(artifact_dir / files["book_details"]["path"]), "r")
+    BookDetails = ipc.open_file(source).read_all() #zero-copy view over the mapped file
+
+    with open(artifact_dir / files["tfidf_vectorizer"]["path"], "rb") as f:
+        vectorizer = pickle.load(f)
+    return embeddings, vector_Matrix, vectorizer, BookDetails, manifest
+
+
+def convert_pickles(pickle_dir=BASE_DIR, out_dir=ARTIFACT_DIR):
+    "One time migration of the old book_embeddings/tfidf_matrix/tfidf_vectorizer/book_details pickles."
+    pickle_dir = Path(pickle_dir)
+    loaded = []
+    for name in ("book_embeddings.pkl", "tfidf_matrix.pkl", "tfidf_vectorizer.pkl", "book_details.pkl"):
+        with open(pickle_dir / name, "rb") as f:
+            loaded.append(pickle.load(f))
+    return save_content_artifacts(*loaded, out_dir=out_dir)
+
+
+if __name__ == "__main__":
+    ## python -m app.recommendML.content_artifacts converts the pickles and checks the result
+    manifest = convert_pickles()
+    load_content_artifacts(verify_hashes=True)
+    print(f"Wrote {ARTIFACT_DIR} (content hash {manifest['content_hash'][:12]})")
@@ -0,0 +1,142 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Incremental catalogue embedding builder
+#
+# Every row is keyed by a hash of its title + description, and finished vectors are written to
+# shard files as the build goes. A rerun (or a resumed crash) only embeds hashes no shard has yet,
+# so a nightly catalogue refresh re-embeds just the new and edited books.
+
+import hashlib
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = Path(__file__).resolve().parent
+SHARD_DIR = BASE_DIR / "embedding_shards"
+MODEL_NAME = "bert-base-uncased"
+
+_worker_tokenizer = None
+
+
+def row_hash(title, description):
+    "Content key of a catalogue row; a changed title or description gives a new key."
+    title = "" if pd.isna(title) else str(title)
+    description = "" if pd.isna(description) else str(description)
+    return hashlib.sha1(f"{title}\x1f{description}".encode("utf-8")).hexdigest()
+
+
+def _init_tokenizer(model_name):
+    global _worker_tokenizer
+    from transformers import BertTokenizer
+
+    _worker_tokenizer = BertTokenizer.from_pretrained(model_name)
+
+
+def _tokenize(texts, max_length=512):
+    "Runs in a pool process; numpy arrays pickle back to the parent cheaply."
+    return dict(_worker_tokenizer(texts, padding=True, truncation=True, return_tensors="np", max_length=max_length))
+
+
+def _shard_paths(shard_dir):
+    return sorted(Path(shard_dir).glob("shard_*.npz")) #half written shards end in .partial
+
+
+def load_shards(shard_dir=SHARD_DIR):
+    "Returns (hashes, vectors) of every completed shard."
+    hashes, vectors = [], []
+    for path in _shard_paths(shard_dir):
+        with np.load(path) as shard:
+            hashes.append(shard["hashes"])
+            vectors.append(shard["vectors"])
+    if not hashes:
+        return np.empty(0, dtype="U40"), None
+    return np.concatenate(hashes), np.vstack(vectors)
+
+
+def _write_shard(shard_dir, number, hashes, vectors):
+    "Writes to a temporary name first, so a shard file only ever exists once it is complete."
+    path = Path(shard_dir) / f"shard_{number:05d}.npz"
+    tmp_path = path.with_name(path.name + ".partial")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, hashes=np.asarray(hashes, dtype="U40"), vectors=np.asarray(vectors, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def _finish_shard(shard_dir, encoder, number, chunk, tokenized):
+    vectors = encoder.model(tokenized.result()).pooler_output.numpy()
+    _write_shard(shard_dir, number, chunk, vectors)
+    print(f"[embedding_builder] shard {number} done ({len(chunk)} rows)")
+
+
+def compact_shards(live_hashes, shard_dir=SHARD_DIR, shard_size=4096):
+    "Rewrites the shard store keeping only vectors still used by the catalogue."
+    shard_dir = Path(shard_dir)
+    hashes, vectors = load_shards(shard_dir)
+    if vectors is None:
+        return
+    keep = np.isin(hashes, np.asarray(list(live_hashes), dtype="U40"))
+    if keep.all():
+        return
+
+    hashes, vectors = hashes[keep], vectors[keep]
+    tmp_dir = shard_dir.with_name(shard_dir.name + ".compacting")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for number, start in enumerate(range(0, len(hashes), shard_size)):
+        _write_shard(tmp_dir, number, hashes[start:start + shard_size], vectors[start:start + shard_size])
+    shutil.rmtree(shard_dir)
+    os.replace(tmp_dir, shard_dir)
+
+
+def build_embeddings(df, shard_size=512, workers=None, encoder=None, shard_dir=SHARD_DIR):
+    "When given the catalogue dataframe, this method embeds only rows whose title/description hash has no stored vector and returns the full matrix in row order."
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    texts = (df["title"].fillna("").astype(str) + " " + df["description"].fillna("").astype(str)).tolist()
+    keys = [row_hash(t, d) for t, d in zip(df["title"], df["description"])]
+
+    done_hashes, _ = load_shards(shard_dir)
+    done = set(done_hashes.tolist())
+    todo = {}
+    for key, text in zip(keys, texts):
+        if key not in done and key not in todo:
+            todo[key] = text
+    todo_keys = list(todo)
+    print(f"[embedding_builder] {len(keys)} rows, {len(todo_keys)} new or changed")
+
+    if todo_keys:
+        if encoder is None:
+            from .embedding_service import TransformerEncoder
+
+            encoder = TransformerEncoder(MODEL_NAME)
+
+        next_number = len(_shard_paths(shard_dir))
+        chunks = [todo_keys[i:i + shard_size] for i in range(0, len(todo_keys), shard_size)]
+
+        if hasattr(encoder, "model") and workers != 0:
+            #tokenize upcoming shards in other processes while this one runs the model
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_tokenizer, initargs=(MODEL_NAME,)) as pool:
+                lookahead = 2 * (workers or os.cpu_count() or 1) #bounds how many tokenized shards wait in memory
+                pending = deque()
+                for number, chunk in enumerate(chunks, start=next_number):
+                    pending.append((number, chunk, pool.submit(_tokenize, [todo[key] for key in chunk])))
+                    if len(pending) >= lookahead:
+                        _finish_shard(shard_dir, encoder, *pending.popleft())
+                while pending:
+                    _finish_shard(shard_dir, encoder, *pending.popleft())
+        else:
+            for number, chunk in enumerate(chunks, start=next_number):
+                _write_shard(shard_dir, number, chunk, encoder.encode([todo[key] for key in chunk]))
+                print(f"[embedding_builder] shard {number} done ({len(chunk)} rows)")
+
+    hashes, vectors = load_shards(shard_dir)
+    position = {key: row for row, key in enumerate(hashes.tolist())}
+    embeddings = vectors[[position[key] for key in keys]]
+
+    compact_shards(set(keys), shard_dir)
+    return embeddings
@@ -0,0 +1,154 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Query embedding service: loads the encoder once, micro-batches concurrent queries and caches results
+
+import threading
+import time
+import queue
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+from scipy import sparse
+
+
+def normalize_text(text):
+    "Cache key for a query: lowercased (the model is uncased) with whitespace collapsed."
+    return " ".join(str(text or "").lower().split())
+
+
+class TransformerEncoder:
+    "bert-base-uncased pooled outputs, the same space as the catalogue embeddings built by getDF_matricies."
+    name = "bert"
+
+    def __init__(self, model_name="bert-base-uncased", max_length=512):
+        from transformers import BertTokenizer, TFBertModel #pip install transformers==4.41.2
+
+        self.tokenizer = BertTokenizer.from_pretrained(model_name)
+        self.model = TFBertModel.from_pretrained(model_name, from_pt=True)
+        self.max_length = max_length
+
+    def encode(self, texts):
+        encodings = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors="tf", max_length=self.max_length)
+        return self.model(encodings).pooler_output.numpy().astype(np.float32)
+
+
+class HashingEncoder:
+    "CPU fallback: hashed log term frequencies projected down to a small dense vector. Only comparable with a catalogue encoded the same way."
+    name = "hashing"
+
+    def __init__(self, dim=256, n_features=2**16, density=1 / 16, seed=0):
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, alternate_sign=False, norm=None, stop_words="english"
+        )
+        #fitting only draws the random matrix; it depends on the shape and seed, never on the data.
+        #density is set so every hashed term lands on ~dim/16 outputs, short queries would otherwise project to zero
+        self.projection = SparseRandomProjection(n_components=dim, density=density, random_state=seed)
+        self.projection.fit(sparse.csr_matrix((1, n_features), dtype=np.float32))
+
+    def encode(self, texts):
+        counts = self.vectorizer.transform(list(texts))
+        counts.data = np.log1p(counts.data)
+        projected = self.projection.transform(counts)
+        if sparse.issparse(projected):
+            projected = projected.toarray()
+        return normalize(np.asarray(projected, dtype=np.float32))
+
+
+def load_default_encoder():
+    "Uses the transformer when it can be loaded, otherwise the hashing fallback."
+    try:
+        return TransformerEncoder()
+    except Exception as e:
+        print("[embedding_service] transformer unavailable, using hashing encoder:", repr(e))
+        return HashingEncoder()
+
+
+class QueryEmbeddingService:
+    "Thread-safe, long-lived query encoder. Queries arriving within batch_window seconds of each other are encoded as one batch."
+
+    def __init__(self, encoder_factory=load_default_encoder, batch_window=0.01, max_batch=32, cache_size=4096):
+        self.encoder_factory = encoder_factory
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._worker.start()
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = self.encoder_factory()
+        return self._encoder
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key, vector):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed(self, text, timeout=30):
+        "Returns the (1 x dim) embedding of one query, blocking until its batch has been encoded."
+        key = normalize_text(text)
+        vector = self._cache_get(key)
+        if vector is not None:
+            return vector
+
+        future = Future()
+        self._pending.put((key, future))
+        return future.result(timeout=timeout)
+
+    def _collect_batch(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            keys = list(dict.fromkeys(key for key, future in batch)) #identical queries share one row
+            try:
+                vectors = self.encoder.encode(keys)
+            except Exception as e:
+                for key, future in batch:
+                    future.set_exception(e)
+                continue
+
+            by_key = {}
+            for key, vector in zip(keys, vectors):
+                by_key[key] = vector.reshape(1, -1)
+                self._cache_put(key, by_key[key])
+            for key, future in batch:
+                future.set_result(by_key[key])
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service():
+    "The process-wide query embedding service."
+    return QueryEmbeddingService()
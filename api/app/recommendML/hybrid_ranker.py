@@ -0,0 +1,106 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Hybrid ranking stage: blends engine scores in one space, then re-ranks for diversity
+#
+# CF scores (weighted neighbour ratings) and content scores (cosine similarities) have different scales,
+# so each engine's scores are scaled by its best score to [0, 1] before the weighted blend (the engines
+# return truncated top lists, so their minimum says nothing and is not used). The blended list
+# is then re-ranked with maximal marginal relevance over the catalogue embeddings, so near-duplicate
+# books (same series, same author) do not fill the whole page.
+
+import os
+import numpy as np
+from .candidates import Candidates, SOURCE_POPULAR
+
+RECOMMEND_DIVERSITY = float(os.getenv("RECOMMEND_DIVERSITY", "0.3")) #0 keeps the blended order
+OVERFETCH = 1.5 #candidates per engine, relative to top_n; the diversity re-rank picks from this pool
+POPULARITY_PRIOR = 5 #ratings of pseudo-count pulling rarely rated works towards the global mean
+
+
+def candidate_pool(top_n):
+    "How many candidates each engine is asked for."
+    return max(int(np.ceil(top_n * OVERFETCH)), top_n + 1)
+
+
+def normalize_scores(scores):
+    "Scales scores by the best one so they lie in [0, 1] (negatives clip to 0); all zero or empty lists map to 1."
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+    high = scores.max()
+    if high <= 1e-12:
+        return np.ones_like(scores)
+    return np.clip(scores / high, 0, 1)
+
+
+def blend(parts):
+    "When given (Candidates, weight) pairs, returns the union ranked by the weighted sum of normalized scores."
+    parts = [(c, w) for c, w in parts if len(c) and w > 0]
+    if not parts:
+        return Candidates.empty()
+
+    total = sum(w for c, w in parts)
+    work_ids = np.concatenate([c.work_ids for c, w in parts])
+    weighted = np.concatenate([normalize_scores(c.scores) * (w / total) for c, w in parts])
+    sources = np.concatenate([c.sources for c, w in parts])
+
+    unique_ids, inverse = np.unique(work_ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=weighted, minlength=len(unique_ids)) #absent from an engine counts as 0
+    merged_sources = np.zeros(len(unique_ids), dtype=np.uint8)
+    np.bitwise_or.at(merged_sources, inverse, sources)
+
+    order = np.argsort(-scores, kind="stable")
+    return Candidates(unique_ids[order], scores[order], merged_sources[order])
+
+
+def mmr_rerank(candidates, vectors, top_n, diversity=RECOMMEND_DIVERSITY):
+    "Greedy maximal marginal relevance: each pick maximizes (1 - diversity) * score - diversity * max similarity to earlier picks."
+    n = len(candidates)
+    k = min(top_n, n)
+    if diversity <= 0 or vectors is None or k <= 1:
+        return candidates.head(k)
+
+    vectors = np.asarray(vectors, dtype=np.float32) #unit rows; works without a vector are all zeros
+    relevance = normalize_scores(candidates.scores)
+    max_sim = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = np.empty(k, dtype=np.int64)
+
+    for step in range(k):
+        gain = (1 - diversity) * relevance - diversity * max_sim
+        gain[~available] = -np.inf
+        best = int(np.argmax(gain))
+        picked[step] = best
+        available[best] = False
+        np.maximum(max_sim, vectors @ vectors[best], out=max_sim)
+
+    return candidates.take(picked)
+
+
+def popularity_ranking(user_item):
+    "Every rated work column by shrunk mean rating, best first, with those scores; computed once per CF model."
+    n_works = user_item.shape[1]
+    counts = np.bincount(user_item.indices, minlength=n_works).astype(np.float32)
+    sums = np.bincount(user_item.indices, weights=user_item.data, minlength=n_works).astype(np.float32)
+    if not counts.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    global_mean = sums.sum() / counts.sum()
+    scores = (sums + POPULARITY_PRIOR * global_mean) / (counts + POPULARITY_PRIOR)
+    scores[counts == 0] = 0
+    ranked = np.flatnonzero(scores > 0)
+    ranked = ranked[np.argsort(-scores[ranked], kind="stable")]
+    return ranked, scores[ranked]
+
+
+def popular_candidates(cf_model, top_n, exclude_row=None):
+    "Cold-start candidates: works with the best shrunk mean rating, minus anything the user already rated."
+    ranked, scores = cf_model.popular_cols, cf_model.popular_scores
+    if exclude_row is not None:
+        user_item = cf_model.user_item
+        rated = user_item.indices[user_item.indptr[exclude_row]:user_item.indptr[exclude_row + 1]]
+        #only the head of the ranking can reach the top_n once the user's own works are skipped
+        ranked, scores = ranked[:top_n + len(rated)], scores[:top_n + len(rated)]
+        keep = ~np.isin(ranked, rated)
+        ranked, scores = ranked[keep], scores[keep]
+    return Candidates.from_source(cf_model.work_ids[ranked[:top_n]], scores[:top_n], SOURCE_POPULAR)
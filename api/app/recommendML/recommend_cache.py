@@ -0,0 +1,92 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Recommendation result cache
+#
+# Entries are keyed by (user_id, limit, weights, filters). A fresh entry is served as is; an entry past
+# its ttl but within stale_ttl is still served while one background thread recomputes it; anything older
+# is recomputed in the request. invalidate_user drops every entry of a user after they rate, finish or
+# shelve a book, and a refresh that was already running for them is not allowed to write its result back.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+RECOMMEND_CACHE_TTL = float(os.getenv("RECOMMEND_CACHE_TTL", "600"))
+RECOMMEND_CACHE_STALE_TTL = float(os.getenv("RECOMMEND_CACHE_STALE_TTL", "3600"))
+RECOMMEND_CACHE_SIZE = int(os.getenv("RECOMMEND_CACHE_SIZE", "2048"))
+
+
+def recommendation_key(user_id, limit, weights=(), filters=None):
+    "Hashable cache key; filters is a dict of the content filters (title, genres, ...) and None values are dropped."
+    filters = tuple(sorted((k, str(v)) for k, v in (filters or {}).items() if v is not None))
+    return (str(user_id), int(limit), tuple(float(w) for w in weights), filters)
+
+
+class RecommendationCache:
+    def __init__(self, ttl=RECOMMEND_CACHE_TTL, stale_ttl=RECOMMEND_CACHE_STALE_TTL, max_size=RECOMMEND_CACHE_SIZE, workers=2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict() #key -> (computed_at, value)
+        self._generation = {} #user_id -> bumped on invalidation
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommend-refresh")
+
+    def _store(self, key, value, generation):
+        with self._lock:
+            if self._generation.get(key[0], 0) != generation:
+                return #the user was invalidated while this was computed
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, compute, generation):
+        try:
+            self._store(key, compute(), generation)
+        except Exception as e:
+            print("[recommend_cache] background refresh failed:", repr(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_compute(self, key, compute):
+        "Returns the cached value for key, computing it with compute() when there is nothing servable."
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation.get(key[0], 0)
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._pool.submit(self._refresh, key, compute, generation)
+                    return entry[1]
+
+        value = compute()
+        self._store(key, value, generation)
+        return value
+
+    def invalidate_user(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._generation[user_id] = self._generation.get(user_id, 0) + 1
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            for user_id in {k[0] for k in self._entries}:
+                self._generation[user_id] = self._generation.get(user_id, 0) + 1
+            self._entries.clear()
+
+
+recommendation_cache = RecommendationCache()
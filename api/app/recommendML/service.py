@@ -1,62 +1,58 @@
-from typing import List, Dict
-import os
-from supabase import create_client, Client
+from typing import List, Dict, Optional, Tuple
+from .als_model import load_als_model
 from .weightedcombov2 import recommend_works_for_user
-
-SUPABASE_URL: str = os.environ.get("SUPABASE_URL", "")
-SUPABASE_SERVICE_ROLE_KEY: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
-
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise RuntimeError("Supabase env vars SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY are missing")
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
-
-def _fetch_works_with_details(work_ids: List[int]) -> List[dict]:
-    if not work_ids:
-        return []
-
+from .recommend_cache import recommendation_cache, recommendation_key
+from postgrest.exceptions import APIError
+from ..referenceData import genres
+from ..supabaseRest import get_sync_client
+from ..workCards import (
+    EMBEDDED_SELECT,
+    build_cards,
+    cards_from_embedded,
+    embedded_available,
+    mark_embedded_missing,
+    mark_embedded_ok,
+    work_cards,
+)
+
+
+def _fetch_cards(work_ids: List[str]) -> Dict[str, dict]:
+    if embedded_available():
+        try:
+            resp = get_sync_client().table("works").select(EMBEDDED_SELECT).in_("work_id", work_ids).execute()
+        except APIError as e:
+            if e.code != "PGRST200":
+                raise
+            mark_embedded_missing(e.message)
+        else:
+            mark_embedded_ok()
+            return cards_from_embedded(resp.data or [])
+
+    return _fetch_cards_chained(work_ids)
+
+
+def _fetch_cards_chained(work_ids: List[str]) -> Dict[str, dict]:
     works_resp = (
-        supabase.table("works")
+        get_sync_client().table("works")
         .select("work_id, title, publish_year, summary")
         .in_("work_id", work_ids)
         .execute()
     )
     works = works_resp.data or []
+    if not works:
+        return {}
 
-    work_map: Dict[int, dict] = {
-        w["work_id"]: {
-            "work_id": w["work_id"],
-            "title": w["title"],
-            "publish_year": w.get("publish_year"),
-            "summary": w.get("summary"),
-            "authors": [],
-            "cover_url": None,
-            "page_count": None,
-        }
-        for w in works
-    }
-
-    if not work_map:
-        return []
-
-    found_ids = list(work_map.keys())
+    found_ids = [w["work_id"] for w in works]
     editions_resp = (
-        supabase.table("editions")
-        .select("edition_id, work_id, page_count, cover_url")
+        get_sync_client().table("editions")
+        .select("edition_id, work_id, page_count, cover_url, pub_date")
         .in_("work_id", found_ids)
         .execute()
     )
     editions = editions_resp.data or []
-    
-    for ed in editions:
-        wid = ed["work_id"]
-        if wid in work_map and work_map[wid]["cover_url"] is None:
-            work_map[wid]["cover_url"] = ed.get("cover_url")
-            work_map[wid]["page_count"] = ed.get("page_count")
 
     wa_resp = (
-        supabase.table("work_authors")
+        get_sync_client().table("work_authors")
         .select("work_id, author_id, order_index")
         .in_("work_id", found_ids)
         .execute()
@@ -64,46 +60,38 @@ def _fetch_works_with_details(work_ids: List[int]) -> List[dict]:
     wa_rows = wa_resp.data or []
 
     author_ids = sorted({wa["author_id"] for wa in wa_rows}) if wa_rows else []
+    authors = []
     if author_ids:
         authors_resp = (
-            supabase.table("authors")
+            get_sync_client().table("authors")
             .select("author_id, sort_name, name")
             .in_("author_id", author_ids)
             .execute()
         )
         authors = authors_resp.data or []
-        author_name_map = {
-            a["author_id"]: a.get("sort_name") or a.get("name")
-            for a in authors
-        }
-    else:
-        author_name_map = {}
-
-    wa_by_work: Dict[int, List[dict]] = {}
-    for wa in wa_rows:
-        wa_by_work.setdefault(wa["work_id"], []).append(wa)
-
-    for wid, wa_list in wa_by_work.items():
-        wa_list.sort(key=lambda x: x.get("order_index", 0))
-        names = [
-            author_name_map.get(wa["author_id"])
-            for wa in wa_list
-            if author_name_map.get(wa["author_id"])
-        ]
-        if wid in work_map:
-            work_map[wid]["authors"] = names
-
-    order_map = {wid: idx for idx, wid in enumerate(work_ids)}
-    ordered = sorted(
-        work_map.values(),
-        key=lambda row: order_map.get(row["work_id"], 10**9),
-    )
+
+    return build_cards(works, editions, wa_rows, authors)
+
+
+def _fetch_works_with_details(work_ids: List[int]) -> List[dict]:
+    if not work_ids:
+        return []
+
+    # popular works are hydrated over and over, so only cache misses reach Supabase
+    cards = work_cards.get_many(work_ids, _fetch_cards)
+    ordered: List[dict] = []
+    seen: set[str] = set()
+    for wid in work_ids:
+        key = str(wid)
+        if key in cards and key not in seen:
+            seen.add(key)
+            ordered.append(cards[key])
     return ordered
 
 
 def recommend_newest_works(limit: int = 10) -> List[dict]:
     editions_resp = (
-        supabase.table("editions")
+        get_sync_client().table("editions")
         .select("work_id, pub_date")
         .order("pub_date", desc=True)
         .limit(limit * 3)
@@ -130,66 +118,99 @@ def recommend_newest_works(limit: int = 10) -> List[dict]:
     return _fetch_works_with_details(work_ids)
 
 
-def _titles_to_work_ids(titles: List[str]) -> List[int]:
-    if not titles:
-        return []
+RECENT_INTERACTIONS = 200
+# completions and shelvings are implicit signals; each counts like an average rating (ratings_5k.csv runs 0-10, mean 5)
+INTERACTION_RATING = 5.0
 
-    unique_titles = list(dict.fromkeys(titles))
-    resp = (
-        supabase.table("works")
-        .select("work_id, title")
-        .in_("title", unique_titles)
-        .execute()
-    )
-    rows = resp.data or []
 
-    by_title: Dict[str, int] = {}
-    for row in rows:
-        t = row["title"]
-        if t not in by_title:
-            by_title[t] = row["work_id"]
+def _recent_interactions(user_id: str) -> Optional[Tuple[List[str], List[float]]]:
+    # (work_ids, ratings) from the user's latest completions and shelved works, for folding a user the ALS
+    # model was not trained on into it; None when they have none or they cannot be read
+    try:
+        client = get_sync_client()
+        done = (
+            client.table("completions")
+            .select("work_id")
+            .eq("user_id", user_id)
+            .order("finished_at", desc=True)
+            .limit(RECENT_INTERACTIONS)
+            .execute()
+        ).data or []
+        shelves = client.table("shelves").select("shelf_id").eq("user_id", user_id).execute().data or []
+        shelved = []
+        if shelves:
+            shelved = (
+                client.table("shelf_items")
+                .select("work_id")
+                .in_("shelf_id", [s["shelf_id"] for s in shelves])
+                .order("added_at", desc=True)
+                .limit(RECENT_INTERACTIONS)
+                .execute()
+            ).data or []
+    except Exception as e:
+        print("[recommend_for_user] recent interactions unavailable:", repr(e))
+        return None
+
+    weights: Dict[str, float] = {}
+    for row in done + shelved:
+        wid = row.get("work_id")
+        if wid is not None:
+            weights[wid] = weights.get(wid, 0.0) + INTERACTION_RATING
+    if not weights:
+        return None
+    return list(weights), list(weights.values())
+
+
+def _cached_recommendations(
+    user_id: str,
+    top_n: int,
+    weight_cf: float = 0.4,
+    weight_cb: float = 0.6,
+    **filters,
+) -> List[int]:
+    # the ML output is what is expensive; cards are hydrated per request from their own cache
+    key = recommendation_key(user_id, top_n, (weight_cf, weight_cb), filters)
+
+    def compute() -> List[int]:
+        recent = None
+        if filters.get("strategy") == "als" and load_als_model().user_row(user_id) is None:
+            recent = _recent_interactions(user_id)  # read only on a miss; /invalidate drops the entry when they change
+        return recommend_works_for_user(
+            user_id=user_id, top_n=top_n, weight_cf=weight_cf, weight_cb=weight_cb, recent=recent, **filters
+        )
+
+    return recommendation_cache.get_or_compute(key, compute)
 
-    result_ids: List[int] = []
-    seen: set[int] = set()
-    for t in titles:
-        wid = by_title.get(t)
-        if wid is not None and wid not in seen:
-            result_ids.append(wid)
-            seen.add(wid)
 
-    return result_ids
+def invalidate_recommendations(user_id: str) -> None:
+    recommendation_cache.invalidate_user(user_id)
 
 
 def _fallback_popular_work_ids(limit: int) -> List[int]:
-    resp = supabase.table("works").select("work_id").limit(limit).execute()
+    resp = get_sync_client().table("works").select("work_id").limit(limit).execute()
     rows = resp.data or []
     return [r["work_id"] for r in rows]
 
 
-def recommend_for_user(user_id: str, limit: int = 10) -> List[dict]:
+def recommend_for_user(user_id: str, limit: int = 10, strategy: str = "user") -> List[dict]:
     try:
-        titles = recommend_works_for_user(user_id=user_id, top_n=limit)
-        print("ML returned titles:", titles)
+        work_ids = _cached_recommendations(user_id=user_id, top_n=limit, strategy=strategy)
+        print("ML returned work_ids:", work_ids)
     except Exception as e:
         print("Error in recommend_works_for_user:", e)
-        titles = []
+        work_ids = []
 
-    if not titles:
-        fallback_ids = _fallback_popular_work_ids(limit)
-        return _fetch_works_with_details(fallback_ids)
-
-    work_ids = _titles_to_work_ids(titles)
     if not work_ids:
         fallback_ids = _fallback_popular_work_ids(limit)
         return _fetch_works_with_details(fallback_ids)
 
-    work_ids = work_ids[:limit]
-    return _fetch_works_with_details(work_ids)
+    return _fetch_works_with_details(work_ids[:limit])
 
 
 def recommend_for_user_by_genre(user_id: str, genre: str, limit: int = 10) -> list[dict]:
     try:
-        candidate_ids = recommend_works_for_user(user_id=user_id, top_n=limit * 5)
+        # the content engine is steered towards the genre, so a small over-fetch survives the filter below
+        candidate_ids = _cached_recommendations(user_id=user_id, top_n=limit * 2, genres=genre)
     except Exception as e:
         print(f"[recommend_for_user_by_genre] ML error: {e}")
         return []
@@ -197,19 +218,13 @@ def recommend_for_user_by_genre(user_id: str, genre: str, limit: int = 10) -> li
     if not candidate_ids:
         return []
 
-    genres_resp = (
-        supabase.table("genres")
-        .select("genre_id, name")
-        .ilike("name", f"%{genre}%")
-        .execute()
-    )
-    genre_rows = genres_resp.data or []
-    if not genre_rows:
+    # resolved from the in-memory genre table: every genre whose name contains it, as the ilike query did
+    genre_ids = genres().search(genre)
+    if not genre_ids:
         return _fetch_works_with_details(candidate_ids[:limit])
 
-    genre_ids = [row["genre_id"] for row in genre_rows]
     wg_resp = (
-        supabase.table("work_genres")
+        get_sync_client().table("work_genres")
         .select("work_id, genre_id")
         .in_("work_id", candidate_ids)
         .in_("genre_id", genre_ids)
@@ -0,0 +1,105 @@
+## Capstone Fall 2025
+## BetterReads: A Better Recommendation System
+# Vector indexes for the content-based embedding spaces (BERT and TF-IDF)
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import normalize
+
+
+def top_k(scores, k):
+    "Returns the positions of the k largest scores, best first, without sorting the whole array."
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _as_rows(vectors, normalized=False):
+    "Keeps sparse matrices as csr and dense ones as float32, L2 normalized so a dot product is the cosine similarity."
+    if normalized and vectors.dtype == np.float32:
+        return vectors #already unit rows (e.g. memory-mapped artifacts), so avoid copying them
+    if sparse.issparse(vectors):
+        return normalize(vectors.tocsr().astype(np.float32))
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def _dot(rows, query):
+    "Dot product of every row with a single (dense or 1 x d sparse) query."
+    if sparse.issparse(query):
+        query = query.toarray()
+    query = np.asarray(query, dtype=np.float32).ravel()
+    return np.asarray(rows.dot(query)).ravel()
+
+
+class ExactIndex:
+    "Brute-force cosine search: every row is scored, then the top-k are taken with argpartition."
+    exhaustive = True
+
+    def __init__(self, vectors, normalized=False):
+        self.vectors = _as_rows(vectors, normalized)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def similarity(self, query, ids=None):
+        "Cosine similarity of the query against all rows, or only against the given row ids."
+        query = _as_rows(query)
+        rows = self.vectors if ids is None else self.vectors[ids]
+        return _dot(rows, query)
+
+    def search(self, query, top_n, nprobe=None):
+        "Returns (row ids, similarities) of the top_n closest rows. nprobe is ignored; the scan is always exhaustive."
+        scores = self.similarity(query)
+        ids = top_k(scores, top_n)
+        return ids, scores[ids]
+
+
+class IVFIndex(ExactIndex):
+    "Inverted-file approximate search: rows are bucketed under k-means centroids and only the nprobe closest buckets are scanned."
+    exhaustive = False
+
+    def __init__(self, vectors, normalized=False, n_lists=None, nprobe=8, seed=0):
+        super().__init__(vectors, normalized)
+        n_rows = len(self)
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(n_rows)), n_rows))
+        self.nprobe = nprobe
+
+        kmeans = MiniBatchKMeans(n_clusters=self.n_lists, random_state=seed, n_init=3, batch_size=4096)
+        assignments = kmeans.fit_predict(self.vectors)
+        self.centroids = normalize(np.asarray(kmeans.cluster_centers_, dtype=np.float32))
+
+        #row ids grouped by bucket, so a probe is a slice instead of a mask over every row
+        order = np.argsort(assignments, kind="stable")
+        self.list_rows = order.astype(np.int64)
+        self.list_offsets = np.searchsorted(assignments[order], np.arange(self.n_lists + 1))
+
+    def search(self, query, top_n, nprobe=None):
+        "Returns (row ids, similarities) of the top_n rows found in the nprobe closest buckets; a higher nprobe trades latency for recall."
+        query = _as_rows(query)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        probed = top_k(_dot(self.centroids, query), nprobe)
+
+        candidates = np.concatenate([
+            self.list_rows[self.list_offsets[bucket]:self.list_offsets[bucket + 1]]
+            for bucket in probed
+        ])
+        scores = _dot(self.vectors[candidates], query)
+        best = top_k(scores, top_n)
+        return candidates[best], scores[best]
+
+
+def build_index(vectors, mode="exact", normalized=False, **kwargs):
+    "Builds the index for one embedding space. mode is 'exact', 'ivf', or 'auto' (ivf once the catalogue is large)."
+    if mode == "auto":
+        mode = "ivf" if vectors.shape[0] >= 50_000 else "exact"
+    if mode == "ivf":
+        return IVFIndex(vectors, normalized, **kwargs)
+    if mode == "exact":
+        return ExactIndex(vectors, normalized)
+    raise ValueError(f"Unknown vector index mode: {mode}")
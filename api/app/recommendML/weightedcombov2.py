@@ -3,51 +3,48 @@
 # from sklearn.feature_extraction.text import TfidfVectorizer
 # import numpy as np  
 # import pickle
-from .BERT_TFIDF_Content import recommend_content, getCSVdf
-from .collaborative_testing import getuser_item_matrix, recommend_for_user
+from .BERT_TFIDF_Content import content_candidates, content_ready, getCSVdf, work_vectors
+from .collaborative_testing import CF_STRATEGIES, recommend_als_for_user
+from .cf_model import load_cf_model
+from .candidates import Candidates
+from .hybrid_ranker import RECOMMEND_DIVERSITY, blend, candidate_pool, mmr_rerank, popular_candidates
 
 
-def combinedRS(user_id, user_similarity_df, user_item_matrix, works,
+def combinedRS(user_id, cf_model,
                title=None, description=None, genres=None, author=None,
-                weight_cf=0.4, weight_cb=0.6, top_n=10):
-    
-    collaborative = list()
-    content_based = list()
-    
-    collaborative_recommendations = recommend_for_user(user_id, user_similarity_df, user_item_matrix, works, top_n * 2)
-    if not collaborative_recommendations: #if recommend_for_users are empty
-        recommendations = content_based[:top_n]
+                weight_cf=0.4, weight_cb=0.6, top_n=10, diversity=RECOMMEND_DIVERSITY, strategy="user", recent=None):
+    "Returns the top_n Candidates of the CF (user-, item-based or ALS) and content engines blended by weight and re-ranked for diversity; recent (work_ids, ratings) folds a new user into ALS."
+    if strategy not in CF_STRATEGIES:
+        raise ValueError(f"unknown CF strategy {strategy!r}, expected one of {sorted(CF_STRATEGIES)}")
+    pool = candidate_pool(top_n)
+    if strategy == "als":
+        collaborative = recommend_als_for_user(user_id, cf_model, pool, recent=recent)
     else:
-        for recommendation in collaborative_recommendations:
-            collaborative.append(recommendation[1]) 
+        collaborative = CF_STRATEGIES[strategy](user_id, cf_model, pool)
 
-        #content recommendations returns df splices
-        content_recommendations = recommend_content(title=title, description=description, genres=genres, author=author, top_n=top_n*2)
-        for index, row in content_recommendations.iterrows():
-            title = row["title"]
-            content_based.append(title) 
+    content_based = Candidates.empty()
+    if (title or description or genres or author) and content_ready(): #artifacts missing: CF alone gives the ranking
+        try:
+            content_based = content_candidates(title=title, description=description, genres=genres, author=author, top_n=pool)
+        except Exception as e: #e.g. the query encoder failed; CF alone still gives a ranking
+            print("[combinedRS] content engine unavailable:", repr(e))
 
-        #both lists return only the titles of the books
+    if not len(collaborative):
+        #cold start (no ratings, or no neighbours): well rated popular works stand in for CF
+        collaborative = popular_candidates(cf_model, pool, exclude_row=cf_model.user_row(user_id))
 
-        if (weight_cf + weight_cb != 1):
-            num_cf = int(top_n * weight_cf)
-            num_cb = top_n - num_cf
-        else:
-            num_cf = int(top_n * weight_cf)
-            num_cb = int(top_n * weight_cb)
+    ranked = blend([(collaborative, weight_cf), (content_based, weight_cb)])
+    if len(ranked) <= 1 or diversity <= 0:
+        return ranked.head(top_n)
 
-        recommendations = collaborative[:num_cf] + content_based[:num_cb]
+    vectors = None
+    if content_ready():
+        try:
+            vectors = work_vectors(ranked.work_ids)
+        except Exception as e:
+            print("[combinedRS] no embeddings for the diversity re-rank:", repr(e))
+    return mmr_rerank(ranked, vectors, top_n, diversity)
 
-    #want to make sure there are no duplicates in the list
-    visited = set()
-    unique_recommend = []
-    for title in recommendations:
-        if title not in visited:
-            unique_recommend.append(title)
-            visited.add(title)
-    
-    return unique_recommend[:top_n]
-    
 
 def recommend_works_for_user(
     user_id,
@@ -58,25 +55,14 @@ def recommend_works_for_user(
     description: str | None = None,
     genres: str | None = None,
     author: str | None = None,
+    strategy: str = "user",
+    recent: tuple[list, list] | None = None,
 ) -> list[int]:
 
-    works = getCSVdf("works.csv")
-    users = getCSVdf("users.csv")
-    ratings_5k = getCSVdf("ratings_5k.csv")
-
-    if "rated_at" in ratings_5k.columns:
-        ratings_5k = ratings_5k.drop(columns=["rated_at"])
-    if "publish_year" in works.columns:
-        works = works.drop(columns=["publish_year"])
-
-    ratings_works = ratings_5k.merge(works, on="work_id", how="left")
-    fulldf = ratings_works.merge(users, on="user_id", how="left")
-    user_item_matrix, user_similarity, user_df = getuser_item_matrix(fulldf)
-    titles = combinedRS(
+    cf_model = load_cf_model() #built offline, loaded once per process
+    candidates = combinedRS(
         user_id=user_id,
-        user_similarity_df=user_df,
-        user_item_matrix=user_item_matrix,
-        works=works,
+        cf_model=cf_model,
         title=title,
         description=description,
         genres=genres,
@@ -84,38 +70,22 @@ def recommend_works_for_user(
         weight_cf=weight_cf,
         weight_cb=weight_cb,
         top_n=top_n,
+        strategy=strategy,
+        recent=recent,
     )
-    work_ids: list[int] = []
-    seen: set[int] = set()
-
-    for t in titles:
-        matches = works[works["title"] == t]
-        if not matches.empty:
-            wid = int(matches.iloc[0]["work_id"])
-            if wid not in seen:
-                seen.add(wid)
-                work_ids.append(wid)
-    return work_ids[:top_n]
+    return candidates.ids()
 
 
 if __name__ == "__main__":
 
 ##example 
-    works = getCSVdf("works.csv")
-    users = getCSVdf("users.csv")
     ratings_5k = getCSVdf("ratings_5k.csv")
+    cf_model = load_cf_model()
 
-    ratings_5k = ratings_5k.drop(columns = ["rated_at"]) #time of rating does not matter
-    works = works.drop(columns = ["publish_year"]) #publish year also does not matter in recc.
-
-    ratings_works = ratings_5k.merge(works, on = "work_id", how = "left")
-    fulldf = ratings_works.merge(users, on = "user_id", how = "left")
-    user_item_matrix, user_similarity, user_df = getuser_item_matrix(fulldf)
-
-    user1 = fulldf["user_id"].iloc[0]  
+    user1 = ratings_5k["user_id"].iloc[0]  
     print(f"\nRecommendations for user {user1}:")
-    print(combinedRS(user1, user_df, user_item_matrix, works, genres = "Romance" ))
+    print(combinedRS(user1, cf_model, genres = "Romance" ).to_list())
 
     print(f"\nRecommendations for user {user1}:")
-    print(combinedRS(user1, user_df, user_item_matrix, works, genres = "Dystopia", title = "Tale of Two Cities" ))
+    print(combinedRS(user1, cf_model, genres = "Dystopia", title = "Tale of Two Cities" ).to_list())
     
\ No newline at end of file
@@ -1,7 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import List
-from .recommendML.service import (recommend_for_user, recommend_newest_works)
+from .security import get_current_user
+from .recommendML.service import (invalidate_recommendations, recommend_for_user, recommend_newest_works)
 
 router = APIRouter(prefix="/api/recommend", tags=["recommendations"])
 
@@ -16,11 +17,25 @@ class WorkOut(BaseModel):
 
 
 @router.get("/user", response_model=List[WorkOut])
-def recommend_for_user_public(limit: int = 10):
-    demo_user_id = "1"
-    return recommend_for_user(user_id=demo_user_id, limit=limit)
+def recommend_for_user_public(
+    limit: int = 10,
+    strategy: str = Query("user", pattern="^(user|item|als)$"),
+    user: dict = Depends(get_current_user),
+):
+    # cached under the caller's id, the same key /invalidate drops
+    if not user:
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    return recommend_for_user(user_id=user["id"], limit=limit, strategy=strategy)
 
 
 @router.get("/newest", response_model=List[WorkOut])
 def recommend_newest(limit: int = 10):
     return recommend_newest_works(limit = limit)
+
+
+@router.post("/invalidate", status_code=204)
+def invalidate_user_recommendations(user: dict = Depends(get_current_user)):
+    # called by the web app after the user rates, finishes or shelves a book
+    if not user:
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    invalidate_recommendations(user["id"])
@@ -0,0 +1,170 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .supabaseRest import count, get_sync_client, select
+
+# small, rarely edited lookup tables (genres, optionally author names) held in memory, so hot paths
+# resolve ids and names without a round trip. Loaded at startup, then a background task re-checks
+# the row counts every REFERENCE_CHECK_SECONDS (a changed count is the version bump that triggers a
+# reload) and reloads everything every REFERENCE_REFRESH_SECONDS regardless, which also picks up renames
+REFERENCE_CHECK_SECONDS = float(os.getenv("REFERENCE_CHECK_SECONDS", "60"))
+REFERENCE_REFRESH_SECONDS = float(os.getenv("REFERENCE_REFRESH_SECONDS", "3600"))
+REFERENCE_LOAD_AUTHORS = os.getenv("REFERENCE_LOAD_AUTHORS", "0") == "1"
+PAGE_SIZE = 1000  # PostgREST's default max-rows; bigger tables are read page by page
+
+# name -> (table, id column, name column)
+TABLES: Dict[str, Tuple[str, str, str]] = {
+    "genres": ("genres", "genre_id", "name"),
+    "authors": ("authors", "author_id", "name"),
+}
+
+
+class NameIndex:
+    # immutable snapshot of one table: id -> name, case-insensitive name -> ids, and names sorted for prefix search.
+    # a refresh builds a new index and swaps the reference, so readers on any thread never see a half-built one
+    def __init__(self, rows: Iterable[Dict[str, Any]], id_key: str, name_key: str):
+        self.names: Dict[Any, str] = {}
+        self.ids: Dict[str, List[Any]] = {}
+        for row in rows:
+            item_id, name = row.get(id_key), row.get(name_key)
+            if item_id is None or not name:
+                continue
+            self.names[item_id] = name
+            self.ids.setdefault(name.casefold(), []).append(item_id)
+        self._sorted: List[Tuple[str, Any]] = sorted((name.casefold(), i) for i, name in self.names.items())
+        self._keys = [key for key, _ in self._sorted]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def name(self, item_id: Any) -> Optional[str]:
+        return self.names.get(item_id)
+
+    def lookup(self, name: str) -> List[Any]:
+        # ids whose name equals name, ignoring case
+        return list(self.ids.get((name or "").strip().casefold(), ()))
+
+    def prefix(self, text: str, limit: Optional[int] = None) -> List[Any]:
+        # ids whose name starts with text, ignoring case, in name order
+        text = (text or "").strip().casefold()
+        start = bisect.bisect_left(self._keys, text)
+        stop = bisect.bisect_left(self._keys, text + "\U0010ffff")
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return [item_id for _, item_id in self._sorted[start:stop]]
+
+    def search(self, text: str) -> List[Any]:
+        # what ilike '%text%' matched: every id whose name contains text, ignoring case, in name order
+        key = (text or "").strip().casefold()
+        if not key:
+            return []
+        return [i for k, i in self._sorted if key in k]
+
+    def rows(self, id_key: str, name_key: str) -> List[Dict[str, Any]]:
+        return [{id_key: item_id, name_key: self.names[item_id]} for _, item_id in self._sorted]
+
+
+class ReferenceData:
+    def __init__(self, tables: Iterable[str]):
+        self.tables = list(tables)
+        self.indexes: Dict[str, NameIndex] = {}
+        self.counts: Dict[str, int] = {}
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sync_lock = threading.Lock()
+
+    async def _fetch(self, name: str) -> List[Dict[str, Any]]:
+        table, id_key, name_key = TABLES[name]
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = await select(
+                table,
+                {"select": f"{id_key},{name_key}", "order": f"{id_key}.asc", "limit": str(PAGE_SIZE), "offset": str(len(rows))},
+            )
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+
+    def _fetch_sync(self, name: str) -> List[Dict[str, Any]]:
+        # _fetch for callers without an event loop, page by page the same way
+        table, id_key, name_key = TABLES[name]
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = (
+                get_sync_client().table(table)
+                .select(f"{id_key}, {name_key}")
+                .order(id_key)
+                .range(len(rows), len(rows) + PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+
+    def _install(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        _, id_key, name_key = TABLES[name]
+        self.indexes[name] = NameIndex(rows, id_key, name_key)
+        self.counts[name] = len(rows)
+
+    async def load(self) -> None:
+        results = await asyncio.gather(*(self._fetch(name) for name in self.tables))
+        for name, rows in zip(self.tables, results):
+            self._install(name, rows)
+        self.loaded_at = time.monotonic()
+        print("[reference_data] loaded", {name: len(self.indexes[name]) for name in self.tables})
+
+    async def _changed(self) -> bool:
+        for name in self.tables:
+            table, _, _ = TABLES[name]
+            if await count(table, {}) != self.counts.get(name):
+                return True
+        return False
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(REFERENCE_CHECK_SECONDS)
+            try:
+                stale = self.loaded_at is None or time.monotonic() - self.loaded_at >= REFERENCE_REFRESH_SECONDS
+                if stale or await self._changed():
+                    await self.load()
+            except Exception as e:
+                # keep serving the last good snapshot
+                print("[reference_data] refresh failed:", repr(e))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def invalidate(self) -> None:
+        # forces a reload at the next check, for code that just edited one of the tables
+        self.loaded_at = None
+
+    def index(self, name: str) -> NameIndex:
+        # the current snapshot; sync callers outside the app (scripts, a failed startup load) load it on first use
+        index = self.indexes.get(name)
+        if index is None:
+            with self._sync_lock:
+                index = self.indexes.get(name)
+                if index is None:
+                    self._install(name, self._fetch_sync(name))
+                    index = self.indexes[name]
+        return index
+
+
+reference_data = ReferenceData(["genres", "authors"] if REFERENCE_LOAD_AUTHORS else ["genres"])
+
+
+def genres() -> NameIndex:
+    return reference_data.index("genres")
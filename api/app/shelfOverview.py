@@ -0,0 +1,94 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from .supabaseRest import SupabaseError, is_missing_function, rpc
+
+# sql/shelf_overview.sql
+RPC_NAME = "shelf_overview"
+RETRY_MISSING_AFTER = 600
+
+_missing_since: Optional[float] = None
+
+
+class ShelfOverviewUnavailable(Exception):
+    pass
+
+
+def overview_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "shelf_id": row.get("shelf_id"),
+        "name": row.get("name"),
+        "visibility": row.get("visibility"),
+        "is_default": row.get("is_default", False),
+        "book_count": row.get("book_count") or 0,
+        "cover_url": row.get("cover_url"),
+    }
+
+
+async def fetch_shelf_overview(user_id: str, limit: int) -> List[Dict[str, Any]]:
+    # once the function is known to be missing, skip it for a while instead of paying a 404 per request
+    global _missing_since
+    if _missing_since is not None and time.monotonic() - _missing_since < RETRY_MISSING_AFTER:
+        raise ShelfOverviewUnavailable(RPC_NAME)
+
+    try:
+        rows = await rpc(RPC_NAME, {"p_user_id": user_id, "p_limit": limit})
+    except SupabaseError as e:
+        if is_missing_function(e):
+            print(f"[shelf_overview] {RPC_NAME} is not deployed, using the multi-step queries")
+            _missing_since = time.monotonic()
+            raise ShelfOverviewUnavailable(RPC_NAME) from e
+        raise
+
+    _missing_since = None
+    return [overview_row(row) for row in rows or []]
+
+
+def _has_cover(cover_url: Optional[str]) -> bool:
+    return bool(cover_url) and cover_url.startswith(("http://", "https://", "cover/"))
+
+
+def shelf_overview_local(
+    user_id: str,
+    shelves: Iterable[Dict[str, Any]],
+    shelf_items: Iterable[Dict[str, Any]],
+    editions: Iterable[Dict[str, Any]],
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    # in-process stand-in for the SQL function (same ordering and cover rule), for tests and the local backend
+    user_shelves = [s for s in shelves if str(s.get("user_id")) == str(user_id)]
+    user_shelves.sort(key=lambda s: s.get("name") or "")
+    user_shelves.sort(key=lambda s: bool(s.get("is_default")), reverse=True)
+
+    counts: Dict[str, int] = {}
+    latest: Dict[str, Dict[str, Any]] = {}
+    for item in shelf_items:
+        sid = str(item.get("shelf_id"))
+        counts[sid] = counts.get(sid, 0) + 1
+        if sid not in latest or (item.get("added_at") or "") > (latest[sid].get("added_at") or ""):
+            latest[sid] = item
+
+    covers: Dict[str, Optional[str]] = {}
+    newest_pub: Dict[str, str] = {}
+    for ed in editions:
+        wid = str(ed.get("work_id"))
+        if not _has_cover(ed.get("cover_url")):
+            continue
+        pub = ed.get("pub_date") or ""
+        if wid not in covers or pub > newest_pub[wid]:
+            covers[wid] = ed.get("cover_url")
+            newest_pub[wid] = pub
+
+    result: List[Dict[str, Any]] = []
+    for shelf in user_shelves[:limit]:
+        sid = str(shelf.get("shelf_id"))
+        item = latest.get(sid)
+        result.append(
+            overview_row(
+                {
+                    **shelf,
+                    "book_count": counts.get(sid, 0),
+                    "cover_url": covers.get(str(item.get("work_id"))) if item else None,
+                }
+            )
+        )
+    return result
@@ -0,0 +1,203 @@
+import asyncio
+import importlib.util
+import os
+import random
+from typing import Any, Awaitable, Dict, List, Optional
+import httpx
+from fastapi import HTTPException
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.2
+RETRY_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[Any] = None
+
+
+class SupabaseError(Exception):
+    def __init__(self, resource: str, status_code: Optional[int], body: str):
+        super().__init__(f"{resource}: {status_code} {body}")
+        self.resource = resource
+        self.status_code = status_code
+        self.body = body
+
+
+def supabase_headers(prefer: Optional[str] = None) -> Dict[str, str]:
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers
+
+
+def get_client() -> httpx.AsyncClient:
+    # one keep-alive pool per worker process; HTTP/2 multiplexes requests when h2 is installed
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+            timeout=DEFAULT_TIMEOUT,
+        )
+    return _client
+
+
+def get_sync_client() -> Any:
+    # supabase-py client for the modules that still query synchronously; created on first use so importing them needs no env vars
+    global _sync_client
+    if _sync_client is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise RuntimeError("Supabase env vars SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY are missing")
+        from supabase import create_client
+
+        _sync_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _sync_client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def request(
+    method: str,
+    resource: str,
+    params: Any = None,
+    json: Any = None,
+    prefer: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> httpx.Response:
+    # 5xx answers are only retried for idempotent methods; a failed connect never reached the server so it is always retried
+    method = method.upper()
+    client = get_client()
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            resp = await client.request(
+                method,
+                f"/{resource}",
+                params=params,
+                json=json,
+                headers=supabase_headers(prefer),
+                timeout=timeout if timeout is not None else DEFAULT_TIMEOUT,
+            )
+        except httpx.TransportError as e:
+            retryable = isinstance(e, httpx.ConnectError) or method in IDEMPOTENT_METHODS
+            if last_attempt or not retryable:
+                raise SupabaseError(resource, None, repr(e)) from e
+        else:
+            if resp.status_code < 400:
+                return resp
+            if last_attempt or resp.status_code not in RETRY_STATUSES or method not in IDEMPOTENT_METHODS:
+                raise SupabaseError(resource, resp.status_code, resp.text)
+
+        # exponential backoff with full jitter so retrying workers do not line up
+        await asyncio.sleep(random.uniform(0, RETRY_BACKOFF * (2 ** attempt)))
+
+    raise SupabaseError(resource, None, "retries exhausted")
+
+
+async def select(resource: str, params: Any, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    resp = await request("GET", resource, params=params, timeout=timeout)
+    return resp.json()
+
+
+def parse_content_range(value: Optional[str]) -> Optional[int]:
+    # PostgREST answers Prefer: count=exact with "0-24/3573", or "*/0" when nothing matched
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+async def count(resource: str, params: Any, timeout: Optional[float] = None) -> int:
+    # HEAD + count=exact: the database counts and no rows are transferred, so there is no 10,000 row cap either
+    resp = await request("HEAD", resource, params=params, prefer="count=exact", timeout=timeout)
+    total = parse_content_range(resp.headers.get("content-range"))
+    if total is None:
+        raise SupabaseError(resource, resp.status_code, "response had no Content-Range count")
+    return total
+
+
+async def rpc(function: str, params: Any, timeout: Optional[float] = None) -> Any:
+    # read-only functions are called with GET so they are retried like any other read
+    resp = await request("GET", f"rpc/{function}", params=params, timeout=timeout)
+    return resp.json()
+
+
+def is_missing_function(err: SupabaseError) -> bool:
+    # PGRST202: the function is not in PostgREST's schema cache (not created yet, or created with other arguments)
+    return err.status_code == 404 and "PGRST202" in (err.body or "")
+
+
+def is_missing_table(err: SupabaseError) -> bool:
+    # PGRST205: the table is not in PostgREST's schema cache; older PostgREST versions pass on Postgres' 42P01
+    return err.status_code in (400, 404) and any(code in (err.body or "") for code in ("PGRST205", "42P01"))
+
+
+def is_missing_relationship(err: SupabaseError) -> bool:
+    # PGRST200: an embedded select names a relationship PostgREST has no foreign key for
+    return err.status_code == 400 and "PGRST200" in (err.body or "")
+
+
+async def insert(
+    resource: str,
+    rows: Any,
+    params: Any = None,
+    prefer: str = "return=representation",
+    timeout: Optional[float] = None,
+) -> Any:
+    resp = await request("POST", resource, params=params, json=rows, prefer=prefer, timeout=timeout)
+    return resp.json() if resp.content else None
+
+
+async def gather_queries(
+    queries: Dict[str, Awaitable[Any]],
+    fallbacks: Optional[Dict[str, Any]] = None,
+    log_prefix: str = "supabase",
+) -> Dict[str, Any]:
+    # runs independent queries at once, so an endpoint waits for its slowest query instead of the sum of all of them.
+    # a query with a fallback degrades to it on failure; any other failure is raised once every query has settled
+    fallbacks = fallbacks or {}
+    names = list(queries)
+    results = await asyncio.gather(*queries.values(), return_exceptions=True)
+
+    values: Dict[str, Any] = {}
+    failure: Optional[BaseException] = None
+    for name, result in zip(names, results):
+        if not isinstance(result, BaseException):
+            values[name] = result
+        elif name in fallbacks and isinstance(result, Exception):
+            print(f"[{log_prefix}] {name} failed, using fallback:", repr(result))
+            values[name] = fallbacks[name]
+        elif failure is None:
+            failure = result
+
+    if failure is not None:
+        raise failure
+    return values
+
+
+def to_http_exception(err: SupabaseError, log_prefix: str, action: str = "reading") -> HTTPException:
+    print(f"[{log_prefix}] {err.resource} error", err.status_code, err.body)
+
+    if err.status_code is None:
+        return HTTPException(status_code=502, detail=f"Could not reach Supabase while {action} {err.resource}")
+
+    return HTTPException(
+        status_code=500,
+        detail=f"Supabase error while {action} {err.resource} ({err.status_code}): {err.body}",
+    )
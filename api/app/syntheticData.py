@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import json
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+# schema-compatible synthetic data for load and scale tests:
+#   python -m app.syntheticData --users 20000 --works 50000 --ratings-per-user 25 --out synthetic_data
+# writes one CSV per table (the ML engines read works.csv, users.csv, ratings.csv and book_details.csv),
+# fixture.json (table -> rows, loaded by the local PostgREST stand-in) and fixture.sql (plain inserts).
+# users.csv and ratings.csv stand in for the ML training export (ratings_5k.csv) and keep its numeric user
+# ids; the database tables key users by the uuid user_uuid derives from that id, and have no ratings table.
+# work popularity and user activity follow power laws, so a few works get most of the ratings.
+
+GENRES = [
+    "Fantasy", "Science Fiction", "Romance", "Mystery", "Thriller", "Horror", "Historical Fiction",
+    "Literary Fiction", "Young Adult", "Dystopia", "Biography", "Memoir", "History", "Poetry",
+    "Classics", "Self Help", "Graphic Novels", "Adventure", "Humor", "Philosophy",
+]
+FIRST_NAMES = [
+    "Ada", "Ben", "Clara", "Dev", "Elena", "Felix", "Grace", "Hiro", "Iris", "Jonah", "Kira", "Leo",
+    "Maya", "Nico", "Olive", "Priya", "Quinn", "Rosa", "Sam", "Tess", "Umar", "Vera", "Wes", "Yara",
+]
+LAST_NAMES = [
+    "Abbott", "Brooks", "Chen", "Diaz", "Ellis", "Fischer", "Garcia", "Hughes", "Ito", "Jensen",
+    "Khan", "Lopez", "Moreau", "Novak", "Okafor", "Patel", "Quint", "Rossi", "Silva", "Tanaka",
+]
+TITLE_WORDS = [
+    "Shadow", "River", "Glass", "Crown", "Winter", "Ember", "Silent", "Hollow", "Garden", "Storm",
+    "Paper", "Iron", "Velvet", "Midnight", "Salt", "Lantern", "Orchard", "Harbor", "Ash", "Echo",
+]
+SHELF_NAMES = ["to read", "summer", "book club", "re-read", "gifts", "classics"]
+DEFAULT_START = "2023-01-01"
+DEFAULT_END = "2025-10-31"
+
+
+def user_uuid(user_id: int) -> str:
+    # Supabase tables key users by auth uuid; derived from the numeric id so both id spaces line up
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"betterreads-user-{user_id}"))
+
+
+def _power_law(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    # rank 1 is the most popular; ranks are shuffled so popularity is unrelated to id order
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def _timestamps(n: int, start: str, end: str, rng: np.random.Generator) -> np.ndarray:
+    lo = np.datetime64(start, "s")
+    span = (np.datetime64(end, "s") - lo).astype(np.int64)
+    return lo + rng.integers(0, span, n).astype("timedelta64[s]")
+
+
+def generate_catalogue(n_works: int, rng: np.random.Generator) -> Dict[str, pd.DataFrame]:
+    n_authors = max(n_works // 3, 1)
+    first = rng.choice(FIRST_NAMES, n_authors)
+    last = rng.choice(LAST_NAMES, n_authors)
+    suffix = np.arange(1, n_authors + 1).astype(str)
+    authors = pd.DataFrame({
+        "author_id": np.arange(1, n_authors + 1),
+        "name": pd.Series(first) + " " + pd.Series(last) + " " + suffix,
+        "sort_name": pd.Series(last) + ", " + pd.Series(first) + " " + suffix,
+    })
+    genres = pd.DataFrame({"genre_id": np.arange(1, len(GENRES) + 1), "name": GENRES})
+
+    # ids drawn from the whole uint64 range like the real catalogue (works.csv has ids past 2**63), as the
+    # decimal strings the api reads back from the database
+    work_ids = np.unique(rng.integers(1, np.iinfo(np.uint64).max, n_works, dtype=np.uint64, endpoint=True))
+    while len(work_ids) < n_works:
+        extra = rng.integers(1, np.iinfo(np.uint64).max, n_works - len(work_ids), dtype=np.uint64, endpoint=True)
+        work_ids = np.unique(np.concatenate([work_ids, extra]))
+    work_ids = rng.permutation(work_ids).astype(str).astype(object)
+    words = rng.choice(TITLE_WORDS, (n_works, 2))
+    titles = [f"The {a} {b} {i}" for i, (a, b) in enumerate(words, start=1)]
+    publish_year = np.clip(2025 - rng.exponential(25, n_works).astype(int), 1800, 2025)
+    works = pd.DataFrame({
+        "work_id": work_ids,
+        "title": titles,
+        "publish_year": publish_year,
+        "summary": [f"A story of {a.lower()} and {b.lower()}." for a, b in words],
+    })
+
+    n_work_authors = rng.integers(1, 3, n_works)
+    work_authors = pd.DataFrame({
+        "work_id": np.repeat(work_ids, n_work_authors),
+        "author_id": rng.integers(1, n_authors + 1, n_work_authors.sum()),
+        "order_index": np.concatenate([np.arange(k) for k in n_work_authors]),
+    }).drop_duplicates(["work_id", "author_id"])
+
+    n_work_genres = rng.integers(1, 4, n_works)
+    work_genres = pd.DataFrame({
+        "work_id": np.repeat(work_ids, n_work_genres),
+        "genre_id": rng.integers(1, len(GENRES) + 1, n_work_genres.sum()),
+    }).drop_duplicates()
+
+    n_editions = rng.integers(1, 4, n_works)
+    total = int(n_editions.sum())
+    edition_years = np.repeat(publish_year, n_editions) + rng.integers(0, 15, total)
+    pub_date = pd.to_datetime(
+        pd.DataFrame({"year": np.minimum(edition_years, 2025), "month": rng.integers(1, 13, total), "day": rng.integers(1, 29, total)})
+    ).dt.strftime("%Y-%m-%d")
+    editions = pd.DataFrame({
+        "edition_id": np.arange(1, total + 1),
+        "work_id": np.repeat(work_ids, n_editions),
+        "page_count": np.clip(rng.lognormal(5.7, 0.4, total).astype(int), 40, 1500),
+        "cover_url": [f"cover/{i}.jpg" for i in range(1, total + 1)],
+        "pub_date": pub_date,
+    })
+
+    return {
+        "authors": authors,
+        "genres": genres,
+        "works": works,
+        "work_authors": work_authors,
+        "work_genres": work_genres,
+        "editions": editions,
+    }
+
+
+def generate_users(n_users: int) -> pd.DataFrame:
+    ids = np.arange(1, n_users + 1)
+    usernames = [f"user{i:04d}" for i in ids]
+    return pd.DataFrame({
+        "user_id": ids,
+        "username": usernames,
+        "email": [f"{u}@example.com" for u in usernames],
+        "password_hash": [hashlib.sha256(u.encode()).hexdigest() for u in usernames],
+        "display_name": [f"User {i}" for i in ids],
+    })
+
+
+def generate_ratings(
+    users: pd.DataFrame,
+    works: pd.DataFrame,
+    ratings_per_user: float,
+    rng: np.random.Generator,
+    zipf: float = 1.1,
+    start: str = DEFAULT_START,
+    end: str = DEFAULT_END,
+) -> pd.DataFrame:
+    # (user, work) pairs drawn from power-law activity and popularity; a work's ratings scatter around its quality
+    n = int(len(users) * ratings_per_user)
+    user_ids = users["user_id"].to_numpy()[rng.choice(len(users), n, p=_power_law(len(users), 0.8, rng))]
+    work_rows = rng.choice(len(works), n, p=_power_law(len(works), zipf, rng))
+    quality = rng.normal(6, 1.5, len(works))
+    ratings = pd.DataFrame({
+        "user_id": user_ids,
+        "work_id": works["work_id"].to_numpy()[work_rows],
+        "rating_value": np.clip(np.rint(quality[work_rows] + rng.normal(0, 2, n)), 0, 10).astype(int),
+        "rated_at": _timestamps(n, start, end, rng).astype(str),
+    })
+    return ratings.drop_duplicates(["user_id", "work_id"]).reset_index(drop=True)
+
+
+def generate_activity(
+    users: pd.DataFrame,
+    works: pd.DataFrame,
+    ratings: pd.DataFrame,
+    rng: np.random.Generator,
+    start: str = DEFAULT_START,
+    end: str = DEFAULT_END,
+) -> Dict[str, pd.DataFrame]:
+    uuids = {int(uid): user_uuid(int(uid)) for uid in users["user_id"]}
+    rated_at = pd.to_datetime(ratings["rated_at"])
+
+    # most rated books were finished shortly before they were rated
+    finished = ratings[rng.random(len(ratings)) < 0.7]
+    completions = pd.DataFrame({
+        "user_id": finished["user_id"].map(uuids),
+        "work_id": finished["work_id"],
+        "finished_at": (rated_at[finished.index] - pd.to_timedelta(rng.integers(0, 72, len(finished)), unit="h")).astype(str),
+    })
+
+    n_reading = len(users) // 2
+    reading_progress = pd.DataFrame({
+        "user_id": users["user_id"].to_numpy()[rng.integers(0, len(users), n_reading)],
+        "work_id": works["work_id"].to_numpy()[rng.choice(len(works), n_reading, p=_power_law(len(works), 1.1, rng))],
+        "updated_at": _timestamps(n_reading, start, end, rng).astype(str),
+    }).drop_duplicates(["user_id", "work_id"])
+    reading_progress["user_id"] = reading_progress["user_id"].map(uuids)
+
+    # every user gets a default favorites shelf plus up to three distinct custom shelves
+    user_ids = users["user_id"].to_numpy()
+    n_custom = rng.integers(0, 4, len(users))
+    custom_names = np.argsort(rng.random((len(users), len(SHELF_NAMES))), axis=1)
+    custom_mask = np.arange(len(SHELF_NAMES)) < n_custom[:, None]
+    shelf_users = np.concatenate([user_ids, np.repeat(user_ids, n_custom)])
+    shelf_names = np.concatenate([np.full(len(users), "favorites", dtype=object),
+                                  np.array(SHELF_NAMES, dtype=object)[custom_names[custom_mask]]])
+    raw = rng.bytes(16 * len(shelf_users))
+    shelf_ids = np.array([str(uuid.UUID(bytes=raw[i:i + 16])) for i in range(0, len(raw), 16)])
+    shelves = pd.DataFrame({
+        "shelf_id": shelf_ids,
+        "user_id": pd.Series(shelf_users).map(uuids).to_numpy(),
+        "name": shelf_names,
+        "visibility": np.where(rng.random(len(shelf_users)) < 0.7, "private", "public"),
+        "is_default": np.arange(len(shelf_users)) < len(users),
+    })
+
+    # favorites hold the user's well rated works; about a third of the other rated works land on a custom shelf
+    favorite_shelf = dict(zip(user_ids.tolist(), shelf_ids[:len(users)]))
+    liked = ratings[ratings["rating_value"] >= 8]
+    custom_start = np.concatenate([[0], np.cumsum(n_custom)[:-1]]) + len(users)
+    custom_by_user = pd.DataFrame({"start": custom_start, "count": n_custom}, index=user_ids)
+    shelved = ratings[rng.random(len(ratings)) < 0.35].join(custom_by_user, on="user_id")
+    shelved = shelved[shelved["count"] > 0]
+    picks = shelved["start"].to_numpy() + (rng.random(len(shelved)) * shelved["count"].to_numpy()).astype(int)
+    shelf_items = pd.concat([
+        pd.DataFrame({"shelf_id": liked["user_id"].map(favorite_shelf).to_numpy(), "work_id": liked["work_id"].to_numpy()}),
+        pd.DataFrame({"shelf_id": shelf_ids[picks], "work_id": shelved["work_id"].to_numpy()}),
+    ], ignore_index=True)
+    shelf_items["added_at"] = _timestamps(len(shelf_items), start, end, rng).astype(str)
+
+    years = np.arange(int(start[:4]), int(end[:4]) + 1)
+    challenge_users = np.repeat(users["user_id"].to_numpy(), len(years))
+    challenge_years = np.tile(years, len(users))
+    keep = rng.random(len(challenge_users)) < 0.5
+    reading_challenges = pd.DataFrame({
+        "user_id": pd.Series(challenge_users[keep]).map(uuids),
+        "year": challenge_years[keep],
+        "target_count": rng.integers(6, 61, int(keep.sum())),
+    })
+
+    return {
+        "completions": completions.reset_index(drop=True),
+        "reading_progress": reading_progress.reset_index(drop=True),
+        "shelves": shelves,
+        "shelf_items": shelf_items,
+        "reading_challenges": reading_challenges,
+    }
+
+
+def book_details(tables: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    # the content engine's input (title, author, genres, description), one row per work
+    first_author = (
+        tables["work_authors"].sort_values("order_index").drop_duplicates("work_id")
+        .merge(tables["authors"], on="author_id")[["work_id", "name"]]
+    )
+    genre_names = (
+        tables["work_genres"].merge(tables["genres"], on="genre_id")
+        .groupby("work_id")["name"].agg(", ".join)
+    )
+    details = tables["works"][["work_id", "title", "summary"]].merge(first_author, on="work_id", how="left")
+    details["genres"] = details["work_id"].map(genre_names).fillna("")
+    return details.rename(columns={"name": "author", "summary": "description"})[
+        ["title", "author", "genres", "description"]
+    ]
+
+
+def generate(
+    n_users: int = 1000,
+    n_works: int = 5000,
+    ratings_per_user: float = 20,
+    seed: int = 0,
+    zipf: float = 1.1,
+    start: str = DEFAULT_START,
+    end: str = DEFAULT_END,
+) -> Dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    tables = generate_catalogue(n_works, rng)
+    tables["users"] = generate_users(n_users)
+    tables["ratings"] = generate_ratings(tables["users"], tables["works"], ratings_per_user, rng, zipf, start, end)
+    tables.update(generate_activity(tables["users"], tables["works"], tables["ratings"], rng, start, end))
+    tables["book_details"] = book_details(tables)
+    return tables
+
+
+def write_csv(tables: Dict[str, pd.DataFrame], out_dir: Path) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(out_dir / f"{name}.csv", index=False)
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    # numpy scalars are not JSON serializable; to_json converts them (and keeps 64-bit ids exact)
+    return json.loads(df.to_json(orient="records"))
+
+
+# ML-only inputs; the database has no such tables
+NOT_IN_DATABASE = {"users", "ratings", "book_details"}
+
+
+def write_fixture_json(tables: Dict[str, pd.DataFrame], path: Path) -> None:
+    fixture = {name: _records(df) for name, df in tables.items() if name not in NOT_IN_DATABASE}
+    path.write_text(json.dumps(fixture))
+
+
+def _sql_literal(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def write_fixture_sql(tables: Dict[str, pd.DataFrame], path: Path, batch_size: int = 1000) -> None:
+    # plain multi-row inserts, loadable with psql into a database that already has the tables
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("begin;\n")
+        for name, df in tables.items():
+            if name in NOT_IN_DATABASE or df.empty:
+                continue
+            columns = ", ".join(df.columns)
+            records = _records(df)
+            for i in range(0, len(records), batch_size):
+                values = ",\n".join(
+                    "(" + ", ".join(_sql_literal(row[c]) for c in df.columns) + ")"
+                    for row in records[i:i + batch_size]
+                )
+                f.write(f"insert into {name} ({columns}) values\n{values};\n")
+        f.write("commit;\n")
+
+
+def main(argv: Optional[Iterable[str]] = None) -> Dict[str, pd.DataFrame]:
+    parser = argparse.ArgumentParser(description="Generate synthetic BetterReads data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--works", type=int, default=5000)
+    parser.add_argument("--ratings-per-user", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity exponent of works")
+    parser.add_argument("--start", default=DEFAULT_START)
+    parser.add_argument("--end", default=DEFAULT_END)
+    parser.add_argument("--out", type=Path, default=Path("synthetic_data"))
+    parser.add_argument("--formats", nargs="*", default=["csv", "json", "sql"], choices=["csv", "json", "sql"])
+    args = parser.parse_args(argv)
+
+    tables = generate(args.users, args.works, args.ratings_per_user, args.seed, args.zipf, args.start, args.end)
+    args.out.mkdir(parents=True, exist_ok=True)
+    if "csv" in args.formats:
+        write_csv(tables, args.out)
+    if "json" in args.formats:
+        write_fixture_json(tables, args.out / "fixture.json")
+    if "sql" in args.formats:
+        write_fixture_sql(tables, args.out / "fixture.sql")
+
+    for name, df in tables.items():
+        print(f"[synthetic_data] {name}: {len(df)} rows")
+    return tables
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,10 @@
-import os
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+import io
+from typing import Any, Dict, List, Optional
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 import pandas as pd
-from supabase import create_client, Client
-
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+from .referenceData import genres
+from .supabaseRest import get_sync_client
 
 
 def fetch_year_data(user_id: str, year: int):
@@ -16,7 +12,7 @@ def fetch_year_data(user_id: str, year: int):
     end = f"{year + 1}-01-01"
 
     comp_res = (
-        supabase.table("completions")
+        get_sync_client().table("completions")
         .select("work_id, finished_at")
         .eq("user_id", user_id)
         .gte("finished_at", start)
@@ -33,43 +29,41 @@ def fetch_year_data(user_id: str, year: int):
     work_ids = completions_df["work_id"].unique().tolist()
 
     ed_res = (
-        supabase.table("editions")
-        .select("work_id, page_count")
+        get_sync_client().table("editions")
+        .select("work_id, page_count, pub_date")
         .in_("work_id", work_ids)
+        .not_.is_("page_count", "null")
         .execute()
     )
 
-    ed_df = pd.DataFrame(ed_res.data or [])
-    ed_df = ed_df.drop_duplicates("work_id")
+    # same rule as sql/user_year_stats.sql: the newest edition that has a page count
+    ed_df = pd.DataFrame(ed_res.data or [], columns=["work_id", "page_count", "pub_date"])
+    ed_df["pub_date"] = pd.to_datetime(ed_df["pub_date"], errors="coerce")
+    ed_df = (
+        ed_df.dropna(subset=["page_count"])
+        .sort_values("pub_date", ascending=False, na_position="last", kind="stable")
+        .drop_duplicates("work_id")[["work_id", "page_count"]]
+    )
     completions_df = completions_df.merge(ed_df, on="work_id", how="left")
     completions_df["page_count"] = completions_df["page_count"].fillna(0)
 
     wg_res = (
-        supabase.table("work_genres")
+        get_sync_client().table("work_genres")
         .select("work_id, genre_id")
         .in_("work_id", work_ids)
         .execute()
     )
-    wg_df = pd.DataFrame(wg_res.data or [])
-    g_res = supabase.table("genres").select("genre_id, name").execute()
-    genres_df = pd.DataFrame(g_res.data or [])
-    work_genres_df = wg_df.merge(genres_df, on="genre_id", how="left")
+    work_genres_df = pd.DataFrame(wg_res.data or [], columns=["work_id", "genre_id"])
+    # genre names come from the in-memory reference table instead of a query for the whole genres table
+    work_genres_df["name"] = work_genres_df["genre_id"].map(genres().names)
 
     return completions_df, work_genres_df
 
 
-def plot_pages_per_month(completions_df, year, out_path):
-    df = completions_df.copy()
-    df["month"] = df["finished_at"].dt.month
-
-    pages_per_month = (
-        df.groupby("month")["page_count"]
-        .sum()
-        .reindex(range(1, 13), fill_value=0)
-    )
-
-    fig, ax = plt.subplots()
-    ax.bar(range(1, 13), pages_per_month.values)
+def plot_pages_per_month(pages_per_month, year, out_path):
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bar(range(1, 13), pages_per_month)
 
     ax.set_xticks(range(1, 13))
     ax.set_xticklabels(
@@ -81,25 +75,18 @@ def plot_pages_per_month(completions_df, year, out_path):
     ax.set_xlabel("Month")
     ax.set_title(f"Pages read in {year}")
     fig.tight_layout()
-    fig.savefig(out_path)
-    plt.close(fig)
+    fig.savefig(out_path, format="png")
 
 
 def plot_genres_pie(
-    completions_df: pd.DataFrame,
-    work_genres_df: pd.DataFrame,
+    genres: List[Dict[str, Any]],
     year: int,
     out_path: str,
 ):
-    if completions_df.empty or work_genres_df.empty:
+    if not genres:
         return
 
-    read_work_ids = completions_df["work_id"].unique()
-    df = work_genres_df[work_genres_df["work_id"].isin(read_work_ids)]
-
-    counts = df["name"].value_counts()
-    if counts.empty:
-        return
+    counts = pd.Series({g["name"]: g["count"] for g in genres}).sort_values(ascending=False, kind="stable")
 
     max_slices = 8
     if len(counts) > max_slices:
@@ -110,7 +97,8 @@ def plot_genres_pie(
     def autopct_fmt(pct):
         return f"{pct:.1f}%" if pct >= 3 else ""
 
-    fig, ax = plt.subplots()
+    fig = Figure()
+    ax = fig.subplots()
     ax.pie(
         counts.values,
         labels=counts.index,
@@ -121,46 +109,42 @@ def plot_genres_pie(
     ax.axis("equal")
     ax.set_title(f"Genres read in {year}")
     fig.tight_layout()
-    fig.savefig(out_path, bbox_inches="tight")
-    plt.close(fig)
+    fig.savefig(out_path, format="png", bbox_inches="tight")
 
 
-def plot_completion_timeline(completions_df, year, out_path):
-    if completions_df.empty:
+def plot_completion_timeline(finished, year, out_path):
+    if not finished:
         return
 
-    df = completions_df.sort_values("finished_at").copy()
-    df["book_number"] = range(1, len(df) + 1)
+    finished = pd.to_datetime(pd.Series(finished)).sort_values()
 
-    fig, ax = plt.subplots()
-    ax.scatter(df["finished_at"], df["book_number"])
+    fig = Figure()
+    ax = fig.subplots()
+    ax.scatter(finished, range(1, len(finished) + 1))
     ax.xaxis.set_major_locator(mdates.MonthLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%b'))
     ax.set_xlabel("Date finished")
     ax.set_ylabel("Book # finished")
     ax.set_title(f"Reading timeline {year}")
     fig.tight_layout()
-    fig.savefig(out_path)
-    plt.close(fig)
-
+    fig.savefig(out_path, format="png")
 
-def create_yearly_charts(user_id, year, output_dir="charts"):
-    os.makedirs(output_dir, exist_ok=True)
 
-    completions_df, work_genres_df = fetch_year_data(user_id, year)
-    if completions_df.empty:
-        return {}
+CHART_KINDS = ("pages", "genres", "timeline")
 
-    pages_path = os.path.join(output_dir, f"pages_{user_id}_{year}.png")
-    genres_path = os.path.join(output_dir, f"genres_{user_id}_{year}.png")
-    timeline_path = os.path.join(output_dir, f"timeline_{user_id}_{year}.png")
 
-    plot_pages_per_month(completions_df, year, pages_path)
-    plot_genres_pie(completions_df, work_genres_df, year, genres_path)
-    plot_completion_timeline(completions_df, year, timeline_path)
+def render_chart(kind: str, stats: Dict[str, Any]) -> Optional[bytes]:
+    # one chart of a readingStats year record as PNG bytes, drawn into memory; None when there is nothing to draw
+    if not stats["book_count"]:
+        return None
 
-    return {
-        "pages": pages_path,
-        "genres": genres_path,
-        "timeline": timeline_path,
-    }
+    buf = io.BytesIO()
+    if kind == "pages":
+        plot_pages_per_month(stats["pages_per_month"], stats["year"], buf)
+    elif kind == "genres":
+        plot_genres_pie(stats["genres"], stats["year"], buf)
+    elif kind == "timeline":
+        plot_completion_timeline(stats["finished"], stats["year"], buf)
+    else:
+        raise ValueError(f"unknown chart {kind!r}")
+    return buf.getvalue() or None
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .supabaseRest import SupabaseError, gather_queries, is_missing_relationship, select
+
+WORK_CARD_TTL = float(os.getenv("WORK_CARD_TTL", "900"))
+WORK_CARD_NEGATIVE_TTL = float(os.getenv("WORK_CARD_NEGATIVE_TTL", "60"))
+WORK_CARD_CACHE_SIZE = int(os.getenv("WORK_CARD_CACHE_SIZE", "10000"))
+
+# works with their editions and ordered authors in one request; needs the editions.work_id,
+# work_authors.work_id and work_authors.author_id foreign keys
+EMBEDDED_SELECT = (
+    "work_id,title,publish_year,summary,"
+    "editions(edition_id,work_id,page_count,cover_url,pub_date),"
+    "work_authors(work_id,author_id,order_index,authors(author_id,sort_name,name))"
+)
+RETRY_EMBEDDED_AFTER = 600
+
+# a work_id the database does not know; cached so repeated lookups of it skip the round trip
+MISSING = object()
+
+
+def _key(work_id: Any) -> str:
+    return str(work_id)
+
+
+class WorkCardCache:
+    # process-wide work_id -> card map shared by the sync recommendation service and the async home routes,
+    # so it is guarded by a plain lock; every operation on it is a few dict lookups
+    def __init__(
+        self,
+        ttl: float = WORK_CARD_TTL,
+        negative_ttl: float = WORK_CARD_NEGATIVE_TTL,
+        max_size: int = WORK_CARD_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, work_ids: Iterable[Any]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        # (cards found, ids to fetch); ids cached as missing are in neither
+        now = time.monotonic()
+        found: Dict[str, Dict[str, Any]] = {}
+        misses: List[str] = []
+        with self._lock:
+            for wid in work_ids:
+                key = _key(wid)
+                if key in found or key in misses:
+                    continue
+                entry = self._entries.get(key)
+                if entry is None or entry[0] <= now:
+                    misses.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                if entry[1] is not MISSING:
+                    found[key] = entry[1]
+        return found, misses
+
+    def store(self, requested: Iterable[str], cards: Dict[str, Dict[str, Any]]) -> None:
+        # requested ids the fetch did not return are remembered as missing for negative_ttl
+        now = time.monotonic()
+        with self._lock:
+            for key in requested:
+                card = cards.get(key)
+                if card is None:
+                    self._entries[key] = (now + self.negative_ttl, MISSING)
+                else:
+                    self._entries[key] = (now + self.ttl, card)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, work_ids: Optional[Iterable[Any]] = None) -> None:
+        with self._lock:
+            if work_ids is None:
+                self._entries.clear()
+                return
+            for wid in work_ids:
+                self._entries.pop(_key(wid), None)
+
+    def get_many(
+        self,
+        work_ids: Iterable[Any],
+        fetch: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+    ) -> Dict[str, Dict[str, Any]]:
+        found, misses = self.lookup(work_ids)
+        if misses:
+            # one fetch for every miss of this call
+            fetched = fetch(misses)
+            self.store(misses, fetched)
+            found.update((key, fetched[key]) for key in misses if key in fetched)
+        return found
+
+    async def aget_many(self, work_ids: Iterable[Any], fetch) -> Dict[str, Dict[str, Any]]:
+        found, misses = self.lookup(work_ids)
+        if misses:
+            fetched = await fetch(misses)
+            self.store(misses, fetched)
+            found.update((key, fetched[key]) for key in misses if key in fetched)
+        return found
+
+
+work_cards = WorkCardCache()
+
+
+def invalidate_work_cards(work_ids: Optional[Iterable[Any]] = None) -> None:
+    # call after writing works, editions or work_authors; no ids clears the whole cache
+    work_cards.invalidate(work_ids)
+
+
+def build_cards(
+    works: List[Dict[str, Any]],
+    editions: List[Dict[str, Any]],
+    work_authors: List[Dict[str, Any]],
+    authors: List[Dict[str, Any]],
+) -> Dict[str, Dict[str, Any]]:
+    # one card per work: its newest edition (by pub_date) and its authors in order_index order
+    cards: Dict[str, Dict[str, Any]] = {
+        _key(w["work_id"]): {
+            "work_id": w["work_id"],
+            "title": w.get("title"),
+            "publish_year": w.get("publish_year"),
+            "summary": w.get("summary"),
+            "authors": [],
+            "edition_id": None,
+            "cover_url": None,
+            "page_count": None,
+        }
+        for w in works
+    }
+
+    newest: Dict[str, str] = {}
+    for ed in editions:
+        key = _key(ed.get("work_id"))
+        card = cards.get(key)
+        if card is None:
+            continue
+        pub = ed.get("pub_date") or ""
+        if key in newest and pub <= newest[key]:
+            continue
+        newest[key] = pub
+        card["edition_id"] = ed.get("edition_id")
+        card["cover_url"] = ed.get("cover_url")
+        card["page_count"] = ed.get("page_count")
+
+    author_names = {a["author_id"]: a.get("sort_name") or a.get("name") for a in authors}
+    for wa in sorted(work_authors, key=lambda x: x.get("order_index") or 0):
+        card = cards.get(_key(wa.get("work_id")))
+        name = author_names.get(wa.get("author_id"))
+        if card is not None and name:
+            card["authors"].append(name)
+
+    return cards
+
+
+def cards_from_embedded(works: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # flattens the nested EMBEDDED_SELECT rows into the lists build_cards takes
+    editions: List[Dict[str, Any]] = []
+    work_authors: List[Dict[str, Any]] = []
+    authors: Dict[Any, Dict[str, Any]] = {}
+    for w in works:
+        editions.extend(w.get("editions") or [])
+        for wa in w.get("work_authors") or []:
+            work_authors.append(wa)
+            author = wa.get("authors")
+            if author:
+                authors[author["author_id"]] = author
+    return build_cards(works, editions, work_authors, list(authors.values()))
+
+
+_embedded_missing_since: Optional[float] = None
+
+
+def embedded_available() -> bool:
+    return _embedded_missing_since is None or time.monotonic() - _embedded_missing_since >= RETRY_EMBEDDED_AFTER
+
+
+def mark_embedded_missing(detail: str) -> None:
+    # schemas without the foreign keys answer PGRST200; use the chained queries for a while instead
+    global _embedded_missing_since
+    print("[work_cards] embedded select unavailable, using chained queries:", detail)
+    _embedded_missing_since = time.monotonic()
+
+
+def mark_embedded_ok() -> None:
+    global _embedded_missing_since
+    _embedded_missing_since = None
+
+
+def _in_list(ids: Iterable[Any]) -> str:
+    return f"in.({','.join(str(i) for i in ids)})"
+
+
+async def fetch_cards_rest(work_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if embedded_available():
+        try:
+            works = await select("works", {"select": EMBEDDED_SELECT, "work_id": _in_list(work_ids)})
+        except SupabaseError as e:
+            if not is_missing_relationship(e):
+                raise
+            mark_embedded_missing(e.body)
+        else:
+            mark_embedded_ok()
+            return cards_from_embedded(works)
+
+    return await fetch_cards_chained(work_ids)
+
+
+async def fetch_cards_chained(work_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    works = await select(
+        "works",
+        {"select": "work_id,title,publish_year,summary", "work_id": _in_list(work_ids)},
+    )
+    if not works:
+        return {}
+
+    found_ids = [w["work_id"] for w in works]
+    rows = await gather_queries(
+        {
+            "editions": select(
+                "editions",
+                {"select": "edition_id,work_id,page_count,cover_url,pub_date", "work_id": _in_list(found_ids)},
+            ),
+            "work_authors": select(
+                "work_authors",
+                {"select": "work_id,author_id,order_index", "work_id": _in_list(found_ids)},
+            ),
+        },
+        log_prefix="work_cards",
+    )
+
+    author_ids = sorted({wa["author_id"] for wa in rows["work_authors"]})
+    authors = []
+    if author_ids:
+        authors = await select(
+            "authors",
+            {"select": "author_id,sort_name,name", "author_id": _in_list(author_ids)},
+        )
+
+    return build_cards(works, rows["editions"], rows["work_authors"], authors)
+
+
+async def get_work_cards(work_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    # cards keyed by str(work_id); unknown ids are left out
+    return await work_cards.aget_many(work_ids, fetch_cards_rest)
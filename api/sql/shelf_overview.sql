@@ -0,0 +1,43 @@
+-- Per-shelf item count and latest cover for one user, in a single round trip.
+-- Used by GET /api/home/shelves (app/shelfOverview.py); the handler falls back to
+-- querying shelves, shelf_items and editions separately while this function is missing.
+--
+-- Cover rule (kept in sync with shelf_overview_local): take the shelf's most recently
+-- added item, then that work's newest edition whose cover_url is an http(s) or cover/ path.
+
+create or replace function public.shelf_overview(p_user_id uuid, p_limit integer default 100)
+returns json
+language sql
+stable
+as $$
+  select coalesce(json_agg(row_to_json(overview)), '[]'::json)
+  from (
+    select
+      s.shelf_id,
+      s.name,
+      s.visibility,
+      s.is_default,
+      (select count(*) from shelf_items si where si.shelf_id = s.shelf_id) as book_count,
+      (
+        select e.cover_url
+        from editions e
+        where e.work_id = (
+            select si.work_id
+            from shelf_items si
+            where si.shelf_id = s.shelf_id
+            order by si.added_at desc
+            limit 1
+          )
+          and e.cover_url ~ '^(https?://|cover/)'
+        order by e.pub_date desc nulls last
+        limit 1
+      ) as cover_url
+    from shelves s
+    where s.user_id = p_user_id
+    order by s.is_default desc, s.name asc
+    limit p_limit
+  ) overview;
+$$;
+
+-- shelf_items(shelf_id, added_at) keeps both subqueries index-only per shelf
+create index if not exists shelf_items_shelf_added_idx on shelf_items (shelf_id, added_at desc);
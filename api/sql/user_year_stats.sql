@@ -0,0 +1,176 @@
+-- Materialized reading stats, one row per (user, year): what the profile charts, GET /api/home/stats and
+-- the reading challenge read (app/readingStats.py). Until this table exists the api computes the same
+-- record from completions, editions and work_genres on every request.
+--
+-- Kept current by a trigger on completions: an insert adds the completion to its year's row
+-- (book and page counts, the month's pages, the finish time, and the work's genres when it is the
+-- work's first completion that year); deletes and updates rebuild the affected rows. Pages come from
+-- the work's newest edition with a page_count. Later edits to editions or work_genres are not
+-- replayed; run the backfill at the end of this file after bulk catalogue changes.
+
+create table if not exists public.user_year_stats (
+  user_id uuid not null,
+  year integer not null,
+  book_count integer not null default 0,
+  page_count integer not null default 0,
+  pages_per_month integer[] not null default array_fill(0, array[12]),
+  genre_counts jsonb not null default '{}'::jsonb, -- genre name -> distinct works read
+  finished timestamptz[] not null default '{}',
+  updated_at timestamptz not null default now(),
+  primary key (user_id, year)
+);
+
+alter table public.user_year_stats enable row level security;
+
+drop policy if exists "user_year_stats_owner_read" on public.user_year_stats;
+create policy "user_year_stats_owner_read" on public.user_year_stats
+  for select using (auth.uid() = user_id);
+
+-- the year range scans of the trigger and of the fallback reads
+create index if not exists completions_user_finished_idx on completions (user_id, finished_at);
+
+
+-- rebuilds one (user, year) row from completions; removes it when nothing is left
+create or replace function public.refresh_user_year_stats(p_user_id uuid, p_year integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  with done as (
+    select
+      c.work_id,
+      c.finished_at,
+      coalesce((
+        select e.page_count
+        from editions e
+        where e.work_id = c.work_id and e.page_count is not null
+        order by e.pub_date desc nulls last
+        limit 1
+      ), 0) as pages
+    from completions c
+    where c.user_id = p_user_id
+      and c.finished_at >= make_date(p_year, 1, 1)
+      and c.finished_at < make_date(p_year + 1, 1, 1)
+  ),
+  genre_totals as (
+    select g.name, count(*)::integer as works
+    from (select distinct work_id from done) d
+    join work_genres wg on wg.work_id = d.work_id
+    join genres g on g.genre_id = wg.genre_id
+    group by g.name
+  )
+  insert into user_year_stats as s (user_id, year, book_count, page_count, pages_per_month, genre_counts, finished, updated_at)
+  select
+    p_user_id,
+    p_year,
+    (select count(*) from done),
+    (select coalesce(sum(pages), 0) from done),
+    array(
+      select coalesce((select sum(pages) from done where extract(month from finished_at)::integer = m), 0)::integer
+      from generate_series(1, 12) m
+      order by m
+    ),
+    coalesce((select jsonb_object_agg(name, works) from genre_totals), '{}'::jsonb),
+    array(select finished_at from done order by finished_at),
+    now()
+  on conflict (user_id, year) do update set
+    book_count = excluded.book_count,
+    page_count = excluded.page_count,
+    pages_per_month = excluded.pages_per_month,
+    genre_counts = excluded.genre_counts,
+    finished = excluded.finished,
+    updated_at = excluded.updated_at;
+
+  delete from user_year_stats
+  where user_id = p_user_id and year = p_year and book_count = 0;
+end;
+$$;
+
+
+create or replace function public.completions_user_year_stats()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_year integer;
+  v_month integer;
+  v_pages integer;
+  v_months integer[];
+  v_genres jsonb := '{}'::jsonb;
+begin
+  if tg_op = 'INSERT' then
+    if new.finished_at is null then
+      return null;
+    end if;
+    v_year := extract(year from new.finished_at)::integer;
+    v_month := extract(month from new.finished_at)::integer;
+    v_pages := coalesce((
+      select e.page_count
+      from editions e
+      where e.work_id = new.work_id and e.page_count is not null
+      order by e.pub_date desc nulls last
+      limit 1
+    ), 0);
+    v_months := array_fill(0, array[12]);
+    v_months[v_month] := v_pages;
+
+    -- genres count distinct works, so a re-read in the same year adds none
+    if (
+      select count(*)
+      from completions c
+      where c.user_id = new.user_id
+        and c.work_id = new.work_id
+        and c.finished_at >= make_date(v_year, 1, 1)
+        and c.finished_at < make_date(v_year + 1, 1, 1)
+    ) = 1 then
+      select coalesce(jsonb_object_agg(g.name, 1), '{}'::jsonb)
+      into v_genres
+      from work_genres wg
+      join genres g on g.genre_id = wg.genre_id
+      where wg.work_id = new.work_id;
+    end if;
+
+    insert into user_year_stats as s (user_id, year, book_count, page_count, pages_per_month, genre_counts, finished)
+    values (new.user_id, v_year, 1, v_pages, v_months, v_genres, array[new.finished_at])
+    on conflict (user_id, year) do update set
+      book_count = s.book_count + 1,
+      page_count = s.page_count + v_pages,
+      pages_per_month[v_month] = s.pages_per_month[v_month] + v_pages,
+      genre_counts = (
+        select coalesce(jsonb_object_agg(k, coalesce((s.genre_counts ->> k)::integer, 0) + coalesce((v_genres ->> k)::integer, 0)), '{}'::jsonb)
+        from jsonb_object_keys(s.genre_counts || v_genres) k
+      ),
+      finished = s.finished || new.finished_at,
+      updated_at = now();
+    return null;
+  end if;
+
+  -- deletes and updates are rare; rebuild the rows they touch
+  if old.finished_at is not null then
+    perform refresh_user_year_stats(old.user_id, extract(year from old.finished_at)::integer);
+  end if;
+  if tg_op = 'UPDATE' and new.finished_at is not null
+     and (new.user_id, extract(year from new.finished_at)) is distinct from (old.user_id, extract(year from old.finished_at)) then
+    perform refresh_user_year_stats(new.user_id, extract(year from new.finished_at)::integer);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists completions_user_year_stats on completions;
+create trigger completions_user_year_stats
+  after insert or update or delete on completions
+  for each row execute function public.completions_user_year_stats();
+
+
+-- backfill (safe to re-run)
+select public.refresh_user_year_stats(y.user_id, y.year)
+from (
+  select distinct user_id, extract(year from finished_at)::integer as year
+  from completions
+  where finished_at is not null
+) y;
@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.recommendML import service
+from app.recommendML.recommend_cache import recommendation_cache
+from app.security import get_current_user
+
+USER_ID = "6f1c2a9e-3b7d-4e52-9a41-0c8d5e7f1b23"
+
+
+def test_invalidate_drops_what_user_cached(monkeypatch):
+    calls = []
+
+    def fake_recommend(user_id, top_n, **kwargs):
+        calls.append(user_id)
+        return [str(100 + i) for i in range(top_n)]
+
+    monkeypatch.setattr(service, "recommend_works_for_user", fake_recommend)
+    monkeypatch.setattr(service, "_fetch_works_with_details", lambda ids: [{"work_id": i, "title": f"Work {i}"} for i in ids])
+    app.dependency_overrides[get_current_user] = lambda: {"id": USER_ID}
+    recommendation_cache.clear()
+    client = TestClient(app)
+    try:
+        assert client.get("/api/recommend/user?limit=3").status_code == 200
+        assert client.get("/api/recommend/user?limit=3").status_code == 200
+        assert calls == [USER_ID]  # the second call was served from the cache
+
+        assert client.post("/api/recommend/invalidate").status_code == 204
+        assert client.get("/api/recommend/user?limit=3").status_code == 200
+        assert calls == [USER_ID, USER_ID]
+    finally:
+        app.dependency_overrides.clear()
+        recommendation_cache.clear()